@@ -0,0 +1,215 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, Hashable, Optional
+from fastapi.responses import JSONResponse
+from jose import JWTError
+from starlette.datastructures import Headers
+from auth import decode_token
+from cache import TTLCache
+from settings import settings
+
+# Route classes by method and path prefix, first match wins. Requests not
+# listed are light reads when safe and writes otherwise, None is never shed.
+ROUTE_CLASSES = (
+    ("POST", "/users/login", "auth"),
+    ("POST", "/users/register", "auth"),
+    ("GET", "/dashboard", "heavy"),
+    ("GET", "/blogs/search", "heavy"),
+    ("GET", "/blogs/export", "heavy"),
+    ("GET", "/blogs/tags/trending", "heavy"),
+    ("POST", "/blogs/batch-get", "heavy"),
+    ("GET", "/metrics", None),
+)
+
+# Methods that only read
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Function to get the admission class of a request.
+    """
+    for class_method, prefix, name in ROUTE_CLASSES:
+        if method == class_method and (path == prefix or path.startswith(prefix + "/")):
+            return name
+    return "light" if method in SAFE_METHODS else "write"
+
+# Class to bound the requests of a route class running at once
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, queue_timeout: float, max_waiting: int):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.max_waiting = max_waiting
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a slot, return False if the request should be shed.
+        """
+        if self.semaphore.locked() and self.waiting >= self.max_waiting:
+            self.shed += 1
+            return False
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+# Interface of the storage behind the rate limiter. A shared backend (for
+# example Redis) applies the limits across workers; it must take the token
+# atomically.
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key: Hashable, rate: float, burst: int) -> float:
+        """
+        Take a token from the bucket of the key.
+
+        Returns 0 when granted, otherwise the seconds until a token is free.
+        """
+
+# In-process backend, limits apply per worker. Buckets expire once they
+# would have refilled, so idle clients do not hold memory.
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_clients: int):
+        self.buckets = TTLCache(max_size=max_clients, ttl=0)
+
+    async def take(self, key: Hashable, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self.buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate)
+            return (1 - tokens) / rate
+
+        self.buckets.set(key, (tokens - 1, now),
+                         ttl=(burst - tokens + 1) / rate)
+        return 0.0
+
+
+def client_key(scope: dict) -> tuple:
+    """
+    Function to identify the client of a request for rate limiting.
+
+    Bearer tokens are keyed by their user id, anything else by client IP.
+    """
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            user_id = decode_token(token).get("id")
+        except JWTError:
+            user_id = None
+        if user_id is not None:
+            return ("user", user_id)
+
+    client = scope.get("client")
+    return ("ip", client[0] if client else "unknown")
+
+# Class to hold the admission state of the process
+
+
+class AdmissionController:
+    def __init__(self, limits: Dict[str, int], queue_timeout: float, max_waiting: int, retry_after: int, rate_backend: Optional[RateLimitBackend] = None):
+        self.limiters = {name: ConcurrencyLimiter(limit, queue_timeout, max_waiting)
+                         for name, limit in limits.items()}
+        self.retry_after = retry_after
+        self.rate_backend = rate_backend
+        self.rate_limited = 0
+
+    async def rate_limit_wait(self, scope: dict, name: str) -> float:
+        """
+        Take a token for the request, return the seconds to wait if denied.
+        """
+        if self.rate_backend is None:
+            return 0.0
+
+        # Logins are keyed by IP, they come before any token exists
+        if name == "auth":
+            client = scope.get("client")
+            key = ("auth", client[0] if client else "unknown")
+            rate, burst = settings.login_rate_limit_per_second, settings.login_rate_limit_burst
+        else:
+            key = client_key(scope)
+            rate, burst = settings.rate_limit_per_second, settings.rate_limit_burst
+
+        wait = await self.rate_backend.take(key, rate, burst)
+        if wait:
+            self.rate_limited += 1
+        return wait
+
+
+# Create an instance of the AdmissionController class
+admission = AdmissionController(
+    limits=settings.admission_limits,
+    queue_timeout=settings.admission_queue_timeout_ms / 1000,
+    max_waiting=settings.admission_max_waiting,
+    retry_after=settings.admission_retry_after_seconds,
+    rate_backend=InMemoryRateLimitBackend(
+        settings.rate_limit_max_clients) if settings.rate_limit_enabled else None,
+)
+
+# ASGI middleware shedding requests a route class has no capacity for
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Refuse clients over their rate before they take a slot
+        wait = await self.controller.rate_limit_wait(scope, name)
+        if wait:
+            response = JSONResponse(
+                {"detail": "Too many requests"}, status_code=429,
+                headers={"Retry-After": str(math.ceil(wait))})
+            await response(scope, receive, send)
+            return
+
+        limiter = self.controller.limiters.get(name)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Shed the request rather than queue it past the timeout
+        if not await limiter.acquire():
+            response = JSONResponse(
+                {"detail": "Server is busy, retry later"}, status_code=503,
+                headers={"Retry-After": str(self.controller.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -1,13 +1,65 @@
+import hashlib
+import time
 from bson import ObjectId
 from typing import Annotated
 from settings import settings
 from fastapi import HTTPException, status, Depends
 from dependencies import DatabaseDependency, TokenDependency
 from models import User
+from cache import TTLCache
 from jose import jwt, JWTError
 
+# Cache of authenticated users keyed by user id. Entries expire after the
+# configured TTL so changes made through another worker still propagate.
+user_cache = TTLCache(max_size=settings.user_cache_max_size,
+                      ttl=settings.user_cache_ttl_seconds)
 
-def get_current_user(token: TokenDependency, db: DatabaseDependency) -> User:
+
+# Cache of verified token payloads keyed by the token digest
+token_cache = TTLCache(max_size=settings.token_cache_max_size,
+                       ttl=settings.token_cache_ttl_seconds)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Function to decode and verify a token, reusing earlier verifications.
+
+    Cached payloads never outlive the exp claim of their token.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, settings.secret_key,
+                         algorithms=[settings.algorithm])
+
+    ttl = token_cache.ttl
+    expires_at = payload.get("exp")
+    if isinstance(expires_at, (int, float)):
+        ttl = min(ttl, expires_at - time.time())
+    token_cache.set(digest, payload, ttl=ttl)
+    return payload
+
+
+def user_from_document(document: dict) -> User:
+    """
+    Function to build a User from a Users document.
+    """
+    # Change from _id to id, decoding the ObjectId to a string
+    user = {k: v for k, v in document.items() if k != "_id"}
+    user["id"] = str(document["_id"])
+    return User(**user)
+
+
+def invalidate_cached_user(user_id: str):
+    """
+    Function to drop a user from the authenticated user cache.
+    """
+    user_cache.invalidate(user_id)
+
+
+async def get_current_user(token: TokenDependency, db: DatabaseDependency) -> User:
     """
     Function to get the current user.
     """
@@ -17,8 +69,7 @@ def get_current_user(token: TokenDependency, db: DatabaseDependency) -> User:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key,
-                             algorithms=[settings.algorithm])
+        payload = decode_token(token)
 
         # Retrieve the user from the database using the ObjectId
         user_id = payload.get("id")
@@ -27,21 +78,22 @@ def get_current_user(token: TokenDependency, db: DatabaseDependency) -> User:
     except JWTError:
         raise credentials_exception
 
+    # Serve the user from the cache if possible
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+
     # Get the user from the database
     users = db.get_collection('Users')
-    user = users.find_one({"_id": ObjectId(user_id)})
-
-    # Decode the ObjectId to a string
-    user["_id"] = str(user["_id"])
-
-    # Change from _id to id
-    user["id"] = user.pop("_id")
+    user = await users.find_one({"_id": ObjectId(user_id)})
 
     # If user is None, raise an exception
     if user is None:
         raise credentials_exception
 
-    return User(**user)
+    user = user_from_document(user)
+    user_cache.set(user_id, user)
+    return user
 
 
 # Dependency to get the user
@@ -0,0 +1,470 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+# Weighted mix of the replayed operations
+TRAFFIC_MIX = {
+    "login": 5,
+    "profile": 15,
+    "list_blogs": 25,
+    "dashboard": 25,
+    "get_blog": 15,
+    "search": 5,
+    "create_blog": 10,
+}
+
+# Traffic mix of each scenario
+SCENARIOS = {
+    "mix": TRAFFIC_MIX,
+    # Clients log in over and over, the cheap reads show whether bcrypt
+    # work starves the rest of the app
+    "login-storm": {
+        "login": 80,
+        "list_blogs": 10,
+        "get_blog": 10,
+    },
+    # The same deep listing page read with skip and with a cursor, the
+    # first page is the reference both should stay close to
+    "deep-pagination": {
+        "first_page": 1,
+        "deep_page_skip": 1,
+        "deep_page_cursor": 1,
+    },
+    # Top-10 text searches, seed --blogs toward 1M to size the index
+    "search": {
+        "search": 9,
+        "get_blog": 1,
+    },
+    # Bulk ingestion of --bulk-size blogs per request, as a JSON array and
+    # as streamed NDJSON, reported in docs/sec
+    "bulk": {
+        "bulk_json": 1,
+        "bulk_ndjson": 1,
+    },
+}
+
+# Page size of the pagination scenario
+PAGE_SIZE = 10
+
+# Operations creating many blogs per request, counted in documents too
+BULK_OPERATIONS = ("bulk_json", "bulk_ndjson")
+
+
+def search_terms() -> List[str]:
+    """
+    Function to get the vocabulary the seeded blogs are written with.
+    """
+    from faker.providers.lorem.en_US import Provider
+
+    return list(Provider.word_list)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Function to get a nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def seed_database(args) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Function to reset the benchmark database and seed it.
+    """
+    from pymongo import MongoClient
+    from dummy_data_generator import FAST_HASH_ROUNDS, init_blog_worker, blog_batches, create_users
+    from feed import REBUILD_COMBINATIONS_PIPELINE
+    from tag_stats import REBUILD_TAG_STATS_PIPELINES
+
+    client = MongoClient(args.database_uri)
+    try:
+        client.drop_database(args.database_name)
+        db = client.get_database(args.database_name)
+        workers = os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            users, credentials = create_users(
+                args.users, args.seed, executor, FAST_HASH_ROUNDS)
+        db.Users.insert_many(users, ordered=False)
+
+        authors = [user["username"] for user in users]
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_blog_worker, initargs=(authors,)) as executor:
+            for batch in blog_batches(args.blogs, 1000, args.seed, executor, window=2 * workers):
+                db.Blogs.insert_many(batch, ordered=False)
+        db.Blogs.aggregate(REBUILD_COMBINATIONS_PIPELINE)
+        for pipeline in REBUILD_TAG_STATS_PIPELINES:
+            db.Blogs.aggregate(pipeline)
+
+        blog_ids = [str(blog["_id"]) for blog in db.Blogs.find({}, {"_id": 1}).limit(1000)]
+        return credentials, blog_ids
+    finally:
+        client.close()
+
+
+def prepare_content(args):
+    """
+    Function to store the seeded content in the benchmarked storage mode.
+    """
+    command = [sys.executable, "manage.py", "compress-content"]
+    if args.content_compression:
+        command += ["--codec", args.content_compression]
+    else:
+        command.append("--decompress")
+    subprocess.run(command, env=os.environ.copy(), check=True)
+
+
+def collection_stats(args) -> dict:
+    """
+    Function to measure the size of the blogs the working set has to hold.
+    """
+    from pymongo import MongoClient
+
+    client = MongoClient(args.database_uri)
+    try:
+        db = client.get_database(args.database_name)
+        stats = next(db.Blogs.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    finally:
+        client.close()
+    return {
+        "documents": stats["count"],
+        "data_bytes": stats["size"],
+        "avg_document_bytes": stats.get("avgObjSize", 0),
+        "storage_bytes": stats["storageSize"],
+    }
+
+
+def deep_page(args) -> Tuple[int, str]:
+    """
+    Function to find the deepest requested listing page and its cursor.
+    """
+    from pymongo import MongoClient
+    from pagination import encode_cursor
+
+    client = MongoClient(args.database_uri)
+    try:
+        blogs = client.get_database(args.database_name).Blogs
+        page = max(2, min(args.deep_page, blogs.estimated_document_count() // PAGE_SIZE))
+        # The cursor of a page is the _id of the last blog before it
+        previous = next(blogs.find({}, {"_id": 1}).sort(
+            "_id", 1).skip((page - 1) * PAGE_SIZE - 1).limit(1))
+    finally:
+        client.close()
+    return page, encode_cursor(previous["_id"])
+
+
+def start_server(args) -> subprocess.Popen:
+    """
+    Function to boot the app from main.py in a uvicorn subprocess.
+    """
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+
+
+async def wait_for_server(client, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/openapi.json")
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("The server did not start in time")
+
+
+async def run_client(client, scenario: str, bulk_size: int, credentials: List[Tuple[str, str]], blog_ids: List[str], deep: Tuple[int, str], deadline: float, rng: random.Random, samples: Dict[str, List[float]], errors: Dict[str, int], shed: Dict[str, int], documents: Dict[str, int]):
+    """
+    Function to replay the traffic mix as one virtual client until the deadline.
+    """
+    traffic_mix = SCENARIOS[scenario]
+    operations = list(traffic_mix)
+    weights = [traffic_mix[operation] for operation in operations]
+    username, password = rng.choice(credentials)
+    terms = search_terms()
+    headers = {}
+
+    async def login():
+        response = await client.post("/users/login", data={"username": username, "password": password})
+        if response.status_code == 200:
+            headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        return response
+
+    def bulk_blogs() -> List[dict]:
+        return [{"title": f"Bulk blog {index}", "content": "Bulk content " * 80, "author": username,
+                 "tags": rng.sample(["technology", "travel", "food", "music"], k=2)}
+                for index in range(bulk_size)]
+
+    requests = {
+        "login": login,
+        "profile": lambda: client.get("/users/profile", headers=headers),
+        "list_blogs": lambda: client.get("/blogs/", params={"page": rng.randint(1, 50)}),
+        "dashboard": lambda: client.get("/dashboard/", headers=headers, params={"page": rng.randint(1, 10)}),
+        "get_blog": lambda: client.get(f"/blogs/{rng.choice(blog_ids)}"),
+        "search": lambda: client.get("/blogs/search", params={
+            "q": " ".join(rng.sample(terms, k=rng.randint(1, 2))), "limit": 10}),
+        "first_page": lambda: client.get("/blogs/", params={"limit": PAGE_SIZE}),
+        "deep_page_skip": lambda: client.get("/blogs/", params={"page": deep[0], "limit": PAGE_SIZE}),
+        "deep_page_cursor": lambda: client.get("/blogs/", params={"cursor": deep[1], "limit": PAGE_SIZE}),
+        "create_blog": lambda: client.post("/blogs/", headers=headers, json={
+            "title": "Benchmark blog", "content": "Benchmark content " * 50,
+            "author": username, "tags": rng.sample(["technology", "travel", "food", "music"], k=2)}),
+        "bulk_json": lambda: client.post("/blogs/bulk", headers=headers, json=bulk_blogs()),
+        "bulk_ndjson": lambda: client.post(
+            "/blogs/bulk", headers=dict(headers, **{"Content-Type": "application/x-ndjson"}),
+            content="\n".join(json.dumps(blog) for blog in bulk_blogs())),
+    }
+
+    await login()
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await requests[operation]()
+            # Requests shed by admission control are counted apart from errors
+            if response.status_code in (429, 503):
+                shed[operation] += 1
+                continue
+            failed = response.status_code >= 500 or (
+                response.status_code >= 400 and not (operation == "dashboard" and response.status_code == 404))
+            if operation in BULK_OPERATIONS and response.status_code == 200:
+                documents[operation] += response.json()["inserted"]
+        except Exception:
+            failed = True
+        samples[operation].append(time.perf_counter() - start)
+        if failed:
+            errors[operation] += 1
+
+
+async def run_load(args, credentials, blog_ids, deep) -> dict:
+    import httpx
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    shed = defaultdict(int)
+    documents = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30) as client:
+        await wait_for_server(client)
+
+        # Warm up the caches and connection pools before measuring
+        warmup_deadline = time.monotonic() + args.warmup
+        await asyncio.gather(*[
+            run_client(client, args.scenario, args.bulk_size, credentials, blog_ids, deep, warmup_deadline,
+                       random.Random(f"warmup-{i}"), defaultdict(list), defaultdict(int), defaultdict(int),
+                       defaultdict(int))
+            for i in range(args.concurrency)])
+
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*[
+            run_client(client, args.scenario, args.bulk_size, credentials, blog_ids, deep, deadline,
+                       random.Random(f"{args.seed}-{i}"), samples, errors, shed, documents)
+            for i in range(args.concurrency)])
+
+    routes = {}
+    for operation in sorted(set(samples) | set(shed)):
+        latencies = sorted(samples[operation])
+        routes[operation] = {
+            "requests": len(latencies),
+            "errors": errors[operation],
+            "shed": shed[operation],
+            "throughput": len(latencies) / args.duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+        if operation in BULK_OPERATIONS:
+            routes[operation]["docs_per_second"] = documents[operation] / args.duration
+    return {
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "throughput": sum(route["requests"] for route in routes.values()) / args.duration,
+        "routes": routes,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Function to list the routes that regressed against the baseline.
+    """
+    regressions = []
+    for operation, expected in baseline.get("routes", {}).items():
+        actual = results["routes"].get(operation)
+        if actual is None:
+            continue
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{operation}: p95 {actual['p95_ms']:.1f}ms > baseline {expected['p95_ms']:.1f}ms")
+        if actual["throughput"] < expected["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{operation}: {actual['throughput']:.1f} req/s < baseline {expected['throughput']:.1f} req/s")
+        if actual["errors"] > expected["errors"]:
+            regressions.append(
+                f"{operation}: {actual['errors']} errors > baseline {expected['errors']}")
+    return regressions
+
+
+def missed_targets(results: dict, targets: Dict[str, float], quantile: str = "p95") -> List[str]:
+    """
+    Function to list the routes whose latency at `quantile` missed its target.
+    """
+    missed = []
+    for operation, target_ms in targets.items():
+        route = results["routes"].get(operation)
+        if route is not None and route[f"{quantile}_ms"] > target_ms:
+            missed.append(f"{operation}: {quantile} {route[f'{quantile}_ms']:.1f}ms > target {target_ms:.1f}ms")
+    return missed
+
+
+def print_report(results: dict):
+    print(f"{'route':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'shed':>8}")
+    for operation, route in results["routes"].items():
+        print(f"{operation:<18}{route['throughput']:>10.1f}{route['p50_ms']:>10.1f}"
+              f"{route['p95_ms']:>10.1f}{route['p99_ms']:>10.1f}{route['errors']:>8}{route.get('shed', 0):>8}")
+    print(f"total: {results['throughput']:.1f} req/s at concurrency {results['concurrency']}, "
+          f"{results.get('scenario', 'mix')} scenario")
+    for operation, route in results["routes"].items():
+        if "docs_per_second" in route:
+            print(f"{operation}: {route['docs_per_second']:.0f} docs/s in batches of {results['bulk_size']}")
+    if results.get("scenario") == "deep-pagination":
+        print(f"deep pages read page {results['deep_page']} of {PAGE_SIZE} blogs")
+    collection = results.get("collection")
+    if collection:
+        print(f"blogs: {collection['documents']} documents, {collection['data_bytes'] / 2**20:.1f} MiB data "
+              f"({collection['avg_document_bytes']} bytes each), {collection['storage_bytes'] / 2**20:.1f} MiB on disk"
+              f", content compression {results['content_compression'] or 'off'}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay a weighted traffic mix against the API and report latency per route")
+    parser.add_argument("--database-uri", default="mongodb://localhost:27017",
+                        help="Local, disposable MongoDB to run against")
+    parser.add_argument("--database-name", default="fastblog_benchmark",
+                        help="Database dropped and reseeded before the run")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--blogs", type=int, default=20000,
+                        help="Blogs seeded, scale toward 1000000 for the search scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true",
+                        help="Reuse the data of a previous run")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mix",
+                        help="Traffic mix to replay")
+    parser.add_argument("--deep-page", type=int, default=5000,
+                        help="Listing page read by the deep-pagination scenario")
+    parser.add_argument("--search-target-ms", type=float, default=100,
+                        help="p95 latency target of a top-10 search, a miss fails the run")
+    parser.add_argument("--storm-p99-ms", type=float, default=250,
+                        help="p99 latency target of the reads in the login-storm scenario, a miss fails the run")
+    parser.add_argument("--bulk-size", type=int, default=500,
+                        help="Blogs per request of the bulk scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="Where the JSON results are written")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON results to compare against, regressions fail the run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression against the baseline")
+    parser.add_argument("--content-compression", choices=["zlib", "zstd"], default=None,
+                        help="Store the blog content compressed during the run")
+    parser.add_argument("--content-min-bytes", type=int, default=1024,
+                        help="Smallest content stored compressed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Point the app at the benchmark database before anything reads the settings
+    os.environ["database_uri"] = args.database_uri
+    os.environ["database_name"] = args.database_name
+    os.environ.setdefault("secret_key", "benchmark-secret")
+    os.environ.setdefault("algorithm", "HS256")
+    if args.content_compression:
+        os.environ["content_compression"] = args.content_compression
+        os.environ["content_compression_allow_unsearchable"] = "true"
+        os.environ["content_compression_min_bytes"] = str(args.content_min_bytes)
+    if args.scenario == "deep-pagination":
+        # Cached pages would hide what the database does for each strategy
+        os.environ["response_cache_enabled"] = "false"
+
+    credentials_file = f"{args.database_name}_credentials.json"
+    if args.skip_seed:
+        if not os.path.exists(credentials_file):
+            sys.exit(f"{credentials_file} not found, run once without --skip-seed to seed the database")
+        with open(credentials_file) as file:
+            credentials, blog_ids = json.load(file)
+        credentials = [tuple(pair) for pair in credentials]
+    else:
+        credentials, blog_ids = seed_database(args)
+        with open(credentials_file, "w") as file:
+            json.dump([credentials, blog_ids], file)
+
+    # Build the indexes up front, the text index takes a while on a large corpus
+    subprocess.run([sys.executable, "manage.py", "ensure-indexes"], env=os.environ.copy(), check=True)
+
+    # Compare working set size and read latency across storage modes
+    prepare_content(args)
+    stats = collection_stats(args)
+    deep = deep_page(args)
+
+    server = start_server(args)
+    try:
+        results = asyncio.run(run_load(args, credentials, blog_ids, deep))
+    finally:
+        server.terminate()
+        server.wait()
+
+    results["content_compression"] = args.content_compression
+    results["deep_page"] = deep[0]
+    results["bulk_size"] = args.bulk_size
+    results["collection"] = stats
+    print_report(results)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    failed = False
+    missed = missed_targets(results, {"search": args.search_target_ms})
+    if args.scenario == "login-storm":
+        # Logins may queue, the unrelated reads must not queue behind them
+        missed += missed_targets(results, {"list_blogs": args.storm_p99_ms, "get_blog": args.storm_p99_ms}, "p99")
+    if missed:
+        print("Latency targets missed:")
+        for line in missed:
+            print(f"  {line}")
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            failed = True
+        else:
+            print("No regressions against the baseline")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
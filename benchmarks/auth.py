@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import os
+import time
+from bson import ObjectId
+
+# Point the settings at a database never reached, the user is served from the cache
+os.environ.setdefault("database_uri", "mongodb://localhost:27017")
+os.environ.setdefault("database_name", "fastblog_benchmark")
+os.environ.setdefault("secret_key", "benchmark-secret")
+os.environ.setdefault("algorithm", "HS256")
+
+from auth import decode_token, get_current_user, token_cache, user_cache  # noqa: E402
+from models import User  # noqa: E402
+from routes.users import create_access_token  # noqa: E402
+
+
+async def time_calls(fn, number: int) -> float:
+    """
+    Function to get the seconds per call of an async function.
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    return (time.perf_counter() - start) / number
+
+
+async def run(number: int):
+    user_id = str(ObjectId())
+    token = create_access_token({"id": user_id, "username": "benchmark"})
+    user_cache.set(user_id, User(id=user_id, username="benchmark", email="benchmark@example.com",
+                                 hashed_password=""))
+
+    async def cold_decode():
+        token_cache.clear()
+        decode_token(token)
+
+    async def warm_decode():
+        decode_token(token)
+
+    async def cold_current_user():
+        token_cache.clear()
+        await get_current_user(token, None)
+
+    async def warm_current_user():
+        await get_current_user(token, None)
+
+    # Each case runs the dependency alone, the user always comes from the cache
+    cases = {
+        "decode_token cold": cold_decode,
+        "decode_token warm": warm_decode,
+        "get_current_user cold token": cold_current_user,
+        "get_current_user warm token": warm_current_user,
+    }
+    print(f"{'case':<30}{'us/call':>10}{'calls/s':>12}")
+    for name, fn in cases.items():
+        await time_calls(fn, min(number, 1000))
+        seconds = await time_calls(fn, number)
+        print(f"{name:<30}{seconds * 1_000_000:>10.2f}{1 / seconds:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the auth dependency with a cold and a warm token cache, no database needed")
+    parser.add_argument("--number", type=int, default=100000,
+                        help="Calls per case")
+    args = parser.parse_args()
+    asyncio.run(run(args.number))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from metrics import CommandMetricsListener, MetricsMiddleware, RequestStats, current_request
+
+# Command event as the driver hands it to the listener
+COMMAND_EVENT = SimpleNamespace(command_name="find", duration_micros=1500)
+
+
+async def trivial_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_scope() -> dict:
+    """
+    Function to build the scope of a GET request, as the server passes it.
+    """
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": "/blogs/",
+        "headers": [(b"host", b"test")],
+        "query_string": b"",
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def time_requests(app, number: int) -> float:
+    """
+    Function to get the seconds per request of an ASGI app, called directly.
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        await app(make_scope(), receive, send)
+    return (time.perf_counter() - start) / number
+
+
+def time_commands(listener: CommandMetricsListener, number: int, in_request: bool) -> float:
+    """
+    Function to get the seconds per succeeded() call of the command listener.
+    """
+    token = current_request.set(RequestStats(make_scope()) if in_request else None)
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            listener.succeeded(COMMAND_EVENT)
+        return (time.perf_counter() - start) / number
+    finally:
+        current_request.reset(token)
+
+
+async def run(number: int):
+    # Each app answers from memory, so the difference is the middleware alone
+    apps = {
+        "no middleware": trivial_app,
+        "MetricsMiddleware": MetricsMiddleware(trivial_app),
+        "MetricsMiddleware+Server-Timing": MetricsMiddleware(trivial_app, server_timing=True),
+    }
+    baseline = None
+    print(f"{'request path':<34}{'us/request':>12}{'overhead us':>13}")
+    for name, app in apps.items():
+        await time_requests(app, min(number, 1000))
+        seconds = await time_requests(app, number)
+        baseline = seconds if baseline is None else baseline
+        print(f"{name:<34}{seconds * 1_000_000:>12.2f}{(seconds - baseline) * 1_000_000:>13.2f}")
+
+    listener = CommandMetricsListener()
+    print(f"\n{'command listener':<34}{'us/call':>12}")
+    for name, in_request in (("succeeded() outside a request", False), ("succeeded() in a request", True)):
+        time_commands(listener, min(number, 1000), in_request)
+        seconds = time_commands(listener, number, in_request)
+        print(f"{name:<34}{seconds * 1_000_000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the overhead of the request and command metrics, no database needed")
+    parser.add_argument("--number", type=int, default=100000,
+                        help="Requests or listener calls per case")
+    args = parser.parse_args()
+    asyncio.run(run(args.number))
+
+
+if __name__ == "__main__":
+    main()
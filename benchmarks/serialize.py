@@ -0,0 +1,87 @@
+import argparse
+import timeit
+from datetime import datetime, timezone
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from models import BlogResponse
+from responses import MongoJSONResponse
+
+# Validator of a listing page, as FastAPI builds it from the response model
+PAGE_ADAPTER = TypeAdapter(List[BlogResponse])
+
+
+def make_page(size: int, content_length: int) -> List[dict]:
+    """
+    Function to build a listing page shaped like the Blogs documents.
+    """
+    return [{
+        "_id": ObjectId(),
+        "title": f"Blog number {index}",
+        "content": "Lorem ipsum dolor sit amet. " * (content_length // 28),
+        "author": f"user{index % 50}",
+        "tags": ["technology", "travel", "food"][:index % 3 + 1],
+        "excerpt": "Lorem ipsum dolor sit amet...",
+        "version": 1,
+        "updated_at": datetime.now(timezone.utc),
+    } for index in range(size)]
+
+
+def jsonable_encoder_response(page: List[dict]) -> bytes:
+    """
+    Function to render a page the way the routes did before, walking the
+    raw documents with jsonable_encoder into a JSONResponse.
+    """
+    return JSONResponse(jsonable_encoder(page, custom_encoder={ObjectId: str})).body
+
+
+def response_model_response(page: List[dict]) -> bytes:
+    """
+    Function to render a page through the BlogResponse model into a
+    MongoJSONResponse, the path of the typed routes.
+    """
+    content = PAGE_ADAPTER.dump_python(PAGE_ADAPTER.validate_python(
+        page), mode="json", by_alias=True, exclude_unset=True)
+    return MongoJSONResponse(content).body
+
+
+def mongo_json_response(page: List[dict]) -> bytes:
+    """
+    Function to render the raw documents with MongoJSONResponse alone.
+    """
+    return MongoJSONResponse(page).body
+
+
+# Compared serialization strategies, the first is the baseline
+STRATEGIES = {
+    "jsonable_encoder+JSONResponse": jsonable_encoder_response,
+    "response_model+MongoJSONResponse": response_model_response,
+    "MongoJSONResponse": mongo_json_response,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the serialization of a listing page, no database needed")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--content-length", type=int, default=2000,
+                        help="Approximate characters of content per blog")
+    parser.add_argument("--number", type=int, default=200,
+                        help="Pages rendered per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    page = make_page(args.page_size, args.content_length)
+    baseline = None
+    print(f"{'strategy':<36}{'us/page':>12}{'speedup':>10}")
+    for name, render in STRATEGIES.items():
+        best = min(timeit.repeat(lambda: render(page), number=args.number, repeat=args.repeat))
+        per_page = best / args.number * 1_000_000
+        baseline = baseline or per_page
+        print(f"{name:<36}{per_page:>12.1f}{baseline / per_page:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
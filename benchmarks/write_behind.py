@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+from bson import ObjectId
+
+# The settings are read on import, the database is given on the command line
+os.environ.setdefault("database_uri", "mongodb://localhost:27017")
+os.environ.setdefault("database_name", "fastblog_benchmark")
+os.environ.setdefault("secret_key", "benchmark-secret")
+os.environ.setdefault("algorithm", "HS256")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from blog_writes import blogs_created, new_blog_document  # noqa: E402
+from models import Blog  # noqa: E402
+from write_behind import BlogWriteBatcher  # noqa: E402
+
+
+def make_documents(count: int) -> List[dict]:
+    """
+    Function to build blog documents the way the create route does.
+    """
+    tags = ["technology", "travel", "food", "music"]
+    return [new_blog_document(Blog(title=f"Benchmark blog {index}", content="Benchmark content " * 50,
+                                   author="benchmark", tags=[tags[index % 4], tags[(index + 1) % 4]]),
+                              "benchmark")
+            for index in range(count)]
+
+
+async def run_writers(documents: List[dict], concurrency: int, write):
+    """
+    Function to write the documents from concurrent writers, one at a time
+    each, like requests of the create route.
+    """
+    queue = iter(documents)
+
+    async def writer():
+        for document in queue:
+            await write(document)
+
+    await asyncio.gather(*[writer() for _ in range(concurrency)])
+
+
+async def time_insert_one(db, documents: List[dict], concurrency: int) -> float:
+    """
+    Function to time the direct path, one insert_one per blog.
+    """
+    collection = db.get_collection('Blogs')
+
+    async def write(document: dict):
+        await collection.insert_one(document)
+        await blogs_created(db, [document])
+
+    start = time.perf_counter()
+    await run_writers(documents, concurrency, write)
+    return time.perf_counter() - start
+
+
+async def time_batcher(db, documents: List[dict], concurrency: int, batch_size: int, flush_interval: float, acknowledged: bool) -> tuple:
+    """
+    Function to time the write-behind path with the given batch size.
+    """
+    batcher = BlogWriteBatcher(batch_size=batch_size, flush_interval=flush_interval,
+                               max_queue=len(documents))
+    batcher.start(db)
+
+    async def write(document: dict):
+        document["_id"] = ObjectId()
+        await batcher.submit(document, acknowledged=acknowledged)
+
+    start = time.perf_counter()
+    await run_writers(documents, concurrency, write)
+    # Fire-and-forget writes are only stored once the queue is drained
+    await batcher.stop()
+    return time.perf_counter() - start, batcher
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_uri)
+    db = client.get_database(args.database_name)
+    try:
+        print(f"{'mode':<22}{'inserts/s':>12}{'batches':>10}{'failed':>8}")
+
+        # Every case starts from an empty database
+        await client.drop_database(args.database_name)
+        seconds = await time_insert_one(db, make_documents(args.documents), args.concurrency)
+        print(f"{'insert_one':<22}{args.documents / seconds:>12.0f}{args.documents:>10}{0:>8}")
+
+        for batch_size in args.batch_sizes:
+            await client.drop_database(args.database_name)
+            seconds, batcher = await time_batcher(
+                db, make_documents(args.documents), args.concurrency, batch_size,
+                args.flush_interval_ms / 1000, not args.unacknowledged)
+            print(f"{f'batch_size={batch_size}':<22}{batcher.flushed_documents / seconds:>12.0f}"
+                  f"{batcher.flushed_batches:>10}{batcher.failed_documents:>8}")
+    finally:
+        await client.drop_database(args.database_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the write-behind batch size and report blog inserts/sec")
+    parser.add_argument("--database-uri", default="mongodb://localhost:27017",
+                        help="Local, disposable MongoDB to run against")
+    parser.add_argument("--database-name", default="fastblog_write_behind_benchmark",
+                        help="Database dropped before every case")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500, 1000],
+                        help="write_behind_batch_size values swept")
+    parser.add_argument("--documents", type=int, default=20000,
+                        help="Blogs written per case")
+    parser.add_argument("--concurrency", type=int, default=1000,
+                        help="Concurrent writers, acknowledged batches hold at most this many blogs")
+    parser.add_argument("--flush-interval-ms", type=float, default=20,
+                        help="write_behind_flush_interval_ms of the batcher")
+    parser.add_argument("--unacknowledged", action="store_true",
+                        help="Return once a blog is queued, like write_behind_acknowledged=false")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
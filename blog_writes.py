@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from compression import stored_content
+from feed import record_blog_tags, record_new_blogs, tag_key
+from models import Blog
+from projection import make_excerpt
+from response_cache import BLOGS_NAMESPACE, response_cache
+from tag_stats import record_tag_changes
+
+
+def new_blog_document(blog: Blog, author: str) -> dict:
+    """
+    Function to build the document stored for a new blog.
+    """
+    blog_dict = blog.dict()
+    blog_dict["author"] = author
+    blog_dict["tag_key"] = tag_key(blog_dict["tags"])
+    blog_dict["excerpt"] = make_excerpt(blog_dict["content"])
+    blog_dict.update(stored_content(blog_dict["content"]))
+    blog_dict["version"] = 1
+    blog_dict["updated_at"] = datetime.now(timezone.utc)
+    return blog_dict
+
+
+async def blogs_created(db: AsyncIOMotorDatabase, documents: List[dict]):
+    """
+    Function to update the derived data after blogs were inserted.
+    """
+    if not documents:
+        return
+    await record_new_blogs(db, [document["tags"] for document in documents])
+    await record_tag_changes(db, [(document["_id"], None, document["tags"]) for document in documents])
+    await response_cache.invalidate(BLOGS_NAMESPACE)
+
+
+async def blog_updated(db: AsyncIOMotorDatabase, blog_id: ObjectId, old_tags: Optional[List[str]], new_tags: Optional[List[str]]):
+    """
+    Function to update the derived data after a blog was updated.
+    """
+    await record_blog_tags(db, added=new_tags, removed=old_tags)
+    await record_tag_changes(db, [(blog_id, old_tags, new_tags)])
+    await response_cache.invalidate(BLOGS_NAMESPACE)
+
+
+async def blog_deleted(db: AsyncIOMotorDatabase, blog_id: ObjectId, old_tags: Optional[List[str]]):
+    """
+    Function to update the derived data after a blog was deleted.
+    """
+    await record_blog_tags(db, removed=old_tags)
+    await record_tag_changes(db, [(blog_id, old_tags, None)])
+    await response_cache.invalidate(BLOGS_NAMESPACE)
@@ -0,0 +1,120 @@
+import zlib
+from typing import List, Optional
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from settings import settings
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, zlib ships with Python
+    zstandard = None
+
+# Field holding the codec of a compressed content, absent on plain text
+CONTENT_ENCODING_FIELD = "content_encoding"
+
+# Default compression level of each codec
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3}
+
+# Fail on startup rather than on the first write
+if settings.content_compression == "zstd" and zstandard is None:
+    raise RuntimeError("content_compression=zstd needs the zstandard package")
+
+
+def compress(data: bytes, codec: str, level: Optional[int] = None) -> bytes:
+    """
+    Function to compress bytes with the given codec.
+    """
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if zstandard is None:
+        raise RuntimeError("zstd compression needs the zstandard package")
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """
+    Function to decompress bytes written by compress.
+    """
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if zstandard is None:
+        raise RuntimeError("zstd compression needs the zstandard package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def stored_content(content: str, codec: Optional[str] = settings.content_compression, min_bytes: int = settings.content_compression_min_bytes, level: Optional[int] = settings.content_compression_level) -> dict:
+    """
+    Function to build the stored content fields of a blog.
+
+    Content of at least `min_bytes` is compressed when a codec is set, and
+    kept as text when compression would not make it smaller.
+    """
+    data = content.encode()
+    if codec is not None and len(data) >= min_bytes:
+        compressed = compress(data, codec, level)
+        if len(compressed) < len(data):
+            return {"content": Binary(compressed), CONTENT_ENCODING_FIELD: codec}
+    return {"content": content}
+
+
+def inflate_content(blog: Optional[dict]) -> Optional[dict]:
+    """
+    Function to decompress the content of a blog read from the database.
+
+    Blogs read without their content are returned untouched, so views that
+    skip the content never pay for the decompression.
+    """
+    if blog is None:
+        return None
+    codec = blog.pop(CONTENT_ENCODING_FIELD, None)
+    if codec is not None and "content" in blog:
+        blog["content"] = decompress(bytes(blog["content"]), codec).decode()
+    return blog
+
+
+def inflate_blogs(blogs: List[dict]) -> List[dict]:
+    """
+    Function to decompress the content of a list of blogs.
+    """
+    for blog in blogs:
+        inflate_content(blog)
+    return blogs
+
+
+async def migrate_content(db: AsyncIOMotorDatabase, codec: Optional[str], min_bytes: int = settings.content_compression_min_bytes, level: Optional[int] = settings.content_compression_level, batch_size: int = 1000) -> int:
+    """
+    Function to compress the content of existing blogs, or store it as
+    text again when `codec` is None.
+
+    Blogs changed since they were read are skipped by matching on their
+    version, the next write stores them with the current settings.
+    """
+    collection = db.get_collection('Blogs')
+    if codec is None:
+        query = {CONTENT_ENCODING_FIELD: {"$exists": True}}
+    else:
+        query = {"content": {"$type": "string"}}
+
+    migrated = 0
+    updates = []
+    async for blog in collection.find(query, {"content": 1, CONTENT_ENCODING_FIELD: 1, "version": 1}):
+        version = blog.pop("version", None)
+        content = inflate_content(blog)["content"]
+        fields = stored_content(content, codec, min_bytes, level)
+        if CONTENT_ENCODING_FIELD not in fields and codec is not None:
+            continue
+        update = {"$set": fields}
+        if CONTENT_ENCODING_FIELD not in fields:
+            update["$unset"] = {CONTENT_ENCODING_FIELD: ""}
+        updates.append(UpdateOne({"_id": blog["_id"], "version": version}, update))
+        if len(updates) >= batch_size:
+            result = await collection.bulk_write(updates, ordered=False)
+            migrated += result.modified_count
+            updates = []
+    if updates:
+        result = await collection.bulk_write(updates, ordered=False)
+        migrated += result.modified_count
+    return migrated
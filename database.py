@@ -1,24 +1,107 @@
-from pymongo.mongo_client import MongoClient
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.read_preferences import (Nearest, Primary, PrimaryPreferred,
+                                      Secondary, SecondaryPreferred)
 from pymongo.server_api import ServerApi
 from settings import settings
+from metrics import CommandMetricsListener, PoolMetricsListener
+from slow_queries import SlowQueryDetector
+
+# Read preference classes by their settings name
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Function to build the read preference of the read-heavy routes
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
 
 # Class to handle the database
 
 
 class Mongo:
-    def __init__(self, database_uri: str, database_name: str):
-        self.client = MongoClient(database_uri, server_api=ServerApi('1'))
-        self.db = self.client.get_database(database_name)
+    def __init__(self, database_uri: str, database_name: str, slow_query_detector: Optional[SlowQueryDetector] = None, client_options: Optional[dict] = None, read_preference=None):
+        self.database_uri = database_uri
+        self.database_name = database_name
+        self.slow_query_detector = slow_query_detector
+        self.client_options = client_options or {}
+        self.read_preference = read_preference
+        self.pool_listener = PoolMetricsListener()
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.read_db: Optional[AsyncIOMotorDatabase] = None
+
+    def connect(self):
+        # Create the async client, it connects lazily on the first operation
+        event_listeners = [CommandMetricsListener(), self.pool_listener]
+        if self.slow_query_detector is not None:
+            event_listeners.append(self.slow_query_detector)
+        self.client = AsyncIOMotorClient(
+            self.database_uri, server_api=ServerApi('1'),
+            event_listeners=event_listeners, **self.client_options)
+        self.db = self.client.get_database(self.database_name)
+
+        # Reads that tolerate staleness may be served by secondaries
+        self.read_db = self.db if self.read_preference is None else self.client.get_database(
+            self.database_name, read_preference=self.read_preference)
+
+        # Explain slow commands in the background of the running event loop
+        if self.slow_query_detector is not None:
+            self.slow_query_detector.start(self.client)
 
     def close(self):
-        self.client.close()
+        if self.slow_query_detector is not None:
+            self.slow_query_detector.stop()
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+        self.read_db = None
+
+
+# Sample slow commands and capture their explain plans in debug mode
+slow_query_detector = SlowQueryDetector(
+    threshold_ms=settings.slow_query_threshold_ms,
+    sample_rate=settings.slow_query_sample_rate,
+    log_file=settings.slow_query_log_file,
+) if settings.slow_query_debug else None
 
+# Pool sizing and timeouts, options left unset keep the driver default
+client_options = {
+    "maxPoolSize": settings.mongo_max_pool_size,
+    "minPoolSize": settings.mongo_min_pool_size,
+    "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+    "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+    "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+    "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+    "compressors": settings.mongo_compressors,
+}
 
-# Create an instance of the Mongo class
-mongodb = Mongo(settings.database_uri, settings.database_name)
+# Create an instance of the Mongo class, connected in the app lifespan
+mongodb = Mongo(settings.database_uri, settings.database_name,
+                slow_query_detector=slow_query_detector,
+                client_options={key: value for key, value in client_options.items()
+                                if value is not None},
+                read_preference=read_preference(settings.mongo_read_preference,
+                                                settings.mongo_max_staleness_seconds))
 
 # Function to get the database
 
 
 def get_db():
     yield mongodb.db
+
+# Function to get the database for reads that may go to a secondary
+
+
+def get_read_db():
+    yield mongodb.read_db
@@ -1,12 +1,15 @@
 from typing import Annotated
 from fastapi import Depends
-from database import get_db
-from pymongo.database import Database
+from database import get_db, get_read_db
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from configs.auth_config import oauth2_scheme
 from models import User
 
 # Dependency to get the database
-DatabaseDependency = Annotated[Database, Depends(get_db)]
+DatabaseDependency = Annotated[AsyncIOMotorDatabase, Depends(get_db)]
+
+# Dependency to get the database for read-heavy routes
+ReadDatabaseDependency = Annotated[AsyncIOMotorDatabase, Depends(get_read_db)]
 
 # Dependency to get the access token
 TokenDependency = Annotated[str, Depends(oauth2_scheme)]
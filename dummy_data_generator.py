@@ -1,82 +1,196 @@
-from typing import List, Optional
-from pydantic import EmailStr, BaseModel
-from faker import Faker
+import argparse
+import os
 import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Iterator, List, Optional, Tuple
+from faker import Faker
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from settings import settings
 from configs.auth_config import bcrypt_context
+from feed import REBUILD_COMBINATIONS_PIPELINE, tag_key
+from projection import make_excerpt
+from tag_stats import REBUILD_TAG_STATS_PIPELINES
 
-fake = Faker()
+# Vocabulary the users and blogs pick their tags from
+TAGS = ["technology", "travel", "food", "sports",
+        "music", "art", "science", "fitness"]
 
+# bcrypt cost of the fast hash mode, far cheaper but still verifiable
+FAST_HASH_ROUNDS = 4
 
-class User(BaseModel):
-    username: str
-    hashed_password: str
-    email: EmailStr
-    role: str = "user"
-    tags: List[str] = []
+# Usernames blogs are attributed to, set in every blog worker
+_authors: List[str] = []
 
 
-class Blog(BaseModel):
-    title: str
-    content: str
-    author: str
-    tags: Optional[List[str]] = []
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """
+    Function to hash a password, with the default cost unless rounds is set.
+    """
+    context = bcrypt_context if rounds is None else bcrypt_context.copy(
+        bcrypt__rounds=rounds)
+    return context.hash(password)
 
 
-def create_users(num_users: int):
+def create_users(num_users: int, seed: Optional[int], executor: ProcessPoolExecutor, rounds: Optional[int]) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """
+    Function to create users, hashing their passwords on the process pool.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+
     users = []
     user_credentials = []
+    usernames = set()
+    emails = set()
     for _ in range(num_users):
+        # Usernames and emails must be unique to log in
         username = fake.user_name()
-        password = fake.password()
-        hashed_password = bcrypt_context.hash(password)
+        while username in usernames:
+            username = f"{fake.user_name()}{rng.randint(0, 9999)}"
         email = fake.email()
-        tags = random.sample(["technology", "travel", "food", "sports",
-                              "music", "art", "science", "fitness"], k=random.randint(1, 4))
-        if random.random() < 0.1:
-            role = "admin"
-        else:
-            role = "user"
-        users.append(
-            User(username=username, hashed_password=hashed_password, email=email, role=role, tags=tags))
+        while email in emails:
+            email = f"{rng.randint(0, 9999)}{fake.email()}"
+        usernames.add(username)
+        emails.add(email)
+
+        password = fake.password()
+        tags = rng.sample(TAGS, k=rng.randint(1, 4))
+        role = "admin" if rng.random() < 0.1 else "user"
+        users.append({"username": username, "email": email,
+                     "role": role, "tags": tags})
         user_credentials.append((username, password))
+
+    hashes = executor.map(partial(hash_password, rounds=rounds),
+                          [password for _, password in user_credentials],
+                          chunksize=max(1, num_users // 64))
+    for user, hashed_password in zip(users, hashes):
+        user["hashed_password"] = hashed_password
     return users, user_credentials
 
 
-def create_blogs(num_blogs: int, users: List[User]):
+def init_blog_worker(authors: List[str]):
+    global _authors
+    _authors = authors
+
+
+def create_blog_batch(seed: Optional[int], batch_index: int, count: int) -> List[dict]:
+    """
+    Function to create one batch of blog documents in a worker process.
+
+    Every batch has its own seed derived from the run seed, so the data
+    does not depend on which worker built it.
+    """
+    batch_seed = None if seed is None else seed * 1_000_003 + batch_index
+    fake = Faker()
+    fake.seed_instance(batch_seed)
+    rng = random.Random(batch_seed)
+
+    now = datetime.now(timezone.utc)
     blogs = []
-    for _ in range(num_blogs):
-        title = fake.sentence()
+    for _ in range(count):
         content = "\n".join(fake.paragraphs(nb=3))
-        author = random.choice(users).username
-        tags = random.sample(["technology", "travel", "food", "sports",
-                              "music", "art", "science", "fitness"], k=random.randint(1, 4))
-        blogs.append(Blog(title=title, content=content,
-                     author=author, tags=tags))
+        tags = rng.sample(TAGS, k=rng.randint(1, 4))
+        blogs.append({
+            "title": fake.sentence(),
+            "content": content,
+            "author": rng.choice(_authors),
+            "tags": tags,
+            "tag_key": tag_key(tags),
+            "excerpt": make_excerpt(content),
+            "version": 1,
+            "updated_at": now,
+        })
     return blogs
 
 
+def blog_batches(num_blogs: int, batch_size: int, seed: Optional[int], executor: ProcessPoolExecutor, window: int) -> Iterator[List[dict]]:
+    """
+    Function to yield blog batches in order, with at most `window` batches
+    being built or waiting at any time so memory stays bounded.
+    """
+    pending = deque()
+    batch_index = 0
+    remaining = num_blogs
+    while remaining or pending:
+        while remaining and len(pending) < window:
+            count = min(batch_size, remaining)
+            pending.append(executor.submit(
+                create_blog_batch, seed, batch_index, count))
+            batch_index += 1
+            remaining -= count
+        yield pending.popleft().result()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Seed the database with dummy users and blogs")
+    parser.add_argument("--users", type=int, default=50,
+                        help="Number of users to create")
+    parser.add_argument("--blogs", type=int, default=5000,
+                        help="Number of blogs to create")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for reproducible data")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Blogs per insert batch")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--hash-mode", choices=["bcrypt", "fast"], default="bcrypt",
+                        help="'fast' hashes passwords with a low bcrypt cost for test data")
+    parser.add_argument("--credentials", default="credentials.txt",
+                        help="File the usernames and passwords are written to")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    rounds = FAST_HASH_ROUNDS if args.hash_mode == "fast" else None
+    workers = args.workers or os.cpu_count() or 1
+
+    client = MongoClient(settings.database_uri, server_api=ServerApi('1'))
     try:
-        client = MongoClient(settings.database_uri, server_api=ServerApi('1'))
         db = client.get_database(settings.database_name)
 
-        users, user_credentials = create_users(50)
-        blogs = create_blogs(5000, users)
+        # Create the users
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            users, user_credentials = create_users(
+                args.users, args.seed, executor, rounds)
+        db.Users.insert_many(users, ordered=False)
+        print(f"Created {len(users)} users in {time.perf_counter() - start:.1f}s")
 
-        db.Users.insert_many(
-            [user.dict(exclude={'password'}) for user in users])
-        db.Blogs.insert_many([blog.dict() for blog in blogs])
-
-        # Write usernames and passwords to credentials.txt
-        with open("credentials.txt", "w") as file:
+        # Write usernames and passwords to the credentials file
+        with open(args.credentials, "w") as file:
             for username, password in user_credentials:
                 file.write(f"{username}:{password}\n")
 
+        # Stream the blogs from the workers into unordered batch inserts
+        start = time.perf_counter()
+        inserted = 0
+        authors = [user["username"] for user in users]
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_blog_worker, initargs=(authors,)) as executor:
+            for batch in blog_batches(args.blogs, args.batch_size, args.seed, executor, window=2 * workers):
+                db.Blogs.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"\rInserted {inserted}/{args.blogs} blogs "
+                      f"({inserted / elapsed:.0f} blogs/s)", end="", flush=True)
+        print()
+
+        # Count the tag sets used by the dashboard feed and the tag counters
+        db.Blogs.aggregate(REBUILD_COMBINATIONS_PIPELINE)
+        for pipeline in REBUILD_TAG_STATS_PIPELINES:
+            db.Blogs.aggregate(pipeline)
+
     except Exception as e:
         print(f"An error occurred: {e}")
+        sys.exit(1)
     finally:
         client.close()
 
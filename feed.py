@@ -0,0 +1,145 @@
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+# Collection holding the number of blogs for every distinct tag set
+COMBINATIONS_COLLECTION = "TagCombinations"
+
+# Projection hiding the feed bookkeeping fields from API responses
+INTERNAL_FIELDS_PROJECTION = {"tag_key": 0}
+
+# Pipeline rebuilding the tag set counts from the tag_key of every blog
+REBUILD_COMBINATIONS_PIPELINE = [
+    {"$match": {"tag_key": {"$type": "string"}}},
+    {"$group": {"_id": "$tag_key", "tags": {"$first": "$tags"}, "count": {"$sum": 1}}},
+    {"$out": COMBINATIONS_COLLECTION},
+]
+
+
+def tag_key(tags: Optional[List[str]]) -> str:
+    """
+    Function to build the canonical key of a tag set, stored on each blog.
+    """
+    return "\x1f".join(sorted(set(tags or [])))
+
+
+async def record_blog_tags(db: AsyncIOMotorDatabase, added: Optional[List[str]] = None, removed: Optional[List[str]] = None):
+    """
+    Function to keep the tag set counts in step with a blog write.
+
+    `added` is the tag list of a blog entering the feed (create, or the
+    new tags of an update) and `removed` the tag list of a blog leaving it.
+    """
+    added_key = tag_key(added) if added is not None else None
+    removed_key = tag_key(removed) if removed is not None else None
+    if added_key == removed_key:
+        return
+
+    combinations = db.get_collection(COMBINATIONS_COLLECTION)
+    if removed_key is not None:
+        await combinations.update_one({"_id": removed_key}, {"$inc": {"count": -1}})
+    if added_key is not None:
+        await combinations.update_one(
+            {"_id": added_key},
+            {"$inc": {"count": 1}, "$setOnInsert": {"tags": sorted(set(added))}},
+            upsert=True,
+        )
+
+
+async def record_new_blogs(db: AsyncIOMotorDatabase, tag_lists: Iterable[List[str]]):
+    """
+    Function to add a batch of new blogs to the tag set counts at once.
+    """
+    counts = Counter()
+    tags_by_key = {}
+    for tags in tag_lists:
+        key = tag_key(tags)
+        counts[key] += 1
+        tags_by_key[key] = tags
+    if not counts:
+        return
+
+    await db.get_collection(COMBINATIONS_COLLECTION).bulk_write([
+        UpdateOne({"_id": key},
+                  {"$inc": {"count": count}, "$setOnInsert": {
+                      "tags": sorted(set(tags_by_key[key]))}},
+                  upsert=True)
+        for key, count in counts.items()
+    ], ordered=False)
+
+
+async def get_feed_page(db: AsyncIOMotorDatabase, user_tags: List[str], limit: int, skip: int = 0, after: Optional[dict] = None, projection: Optional[dict] = None) -> List[dict]:
+    """
+    Function to assemble a dashboard page from the tag set posting lists.
+
+    Blogs are ordered by the number of tags shared with the user, then by
+    _id, the same order as the original aggregation. Every tag set sharing
+    the same number of tags with the user forms one level, read with an
+    indexed range scan on (tag_key, _id) instead of sorting the collection.
+    `projection` defaults to every field except the feed bookkeeping.
+    `skip` is ignored when continuing `after` a cursor.
+    """
+    if limit <= 0:
+        return []
+    if after is not None:
+        skip = 0
+
+    # Group the known tag sets by the number of tags they share with the user
+    user_tags = set(user_tags)
+    levels = defaultdict(list)
+    totals = defaultdict(int)
+    async for combination in db.get_collection(COMBINATIONS_COLLECTION).find({"count": {"$gt": 0}}):
+        common = len(user_tags.intersection(combination["tags"]))
+        if common:
+            levels[common].append(combination["_id"])
+            totals[common] += combination["count"]
+
+    # Walk the levels from the most to the least shared tags
+    collection = db.get_collection('Blogs')
+    blogs = []
+    for common in sorted(levels, reverse=True):
+        query = {"tag_key": {"$in": levels[common]}}
+        if after is not None:
+            if common > after["c"]:
+                continue
+            if common == after["c"]:
+                query["_id"] = {"$gt": after["id"]}
+        elif skip >= totals[common]:
+            # Skip whole levels without reading them
+            skip -= totals[common]
+            continue
+
+        cursor = collection.find(query, projection or INTERNAL_FIELDS_PROJECTION).sort(
+            "_id", 1).skip(skip).limit(limit - len(blogs))
+        skip = 0
+        async for blog in cursor:
+            blog["commonTagsCount"] = common
+            blogs.append(blog)
+
+        if len(blogs) >= limit:
+            break
+
+    return blogs
+
+
+async def rebuild_feed(db: AsyncIOMotorDatabase, batch_size: int = 1000):
+    """
+    Function to backfill tag_key on every blog and recount the tag sets.
+    """
+    collection = db.get_collection('Blogs')
+
+    # Backfill the tag_key of blogs written before the feed existed
+    updates = []
+    async for blog in collection.find({}, {"tags": 1, "tag_key": 1}):
+        key = tag_key(blog.get("tags"))
+        if blog.get("tag_key") != key:
+            updates.append(UpdateOne({"_id": blog["_id"]}, {"$set": {"tag_key": key}}))
+        if len(updates) >= batch_size:
+            await collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+
+    # Recount the tag sets from scratch
+    await collection.aggregate(REBUILD_COMBINATIONS_PIPELINE).to_list(length=None)
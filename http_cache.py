@@ -0,0 +1,92 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+from fastapi import Request
+from settings import settings
+
+# Projection of the fields needed to compute the validators of a blog
+VALIDATOR_PROJECTION = {"version": 1, "updated_at": 1}
+
+
+def with_validator_fields(projection: dict) -> dict:
+    """
+    Function to make sure a projection returns the validator fields.
+    """
+    if any(value for value in projection.values()):
+        return dict(projection, **VALIDATOR_PROJECTION)
+    return projection
+
+
+def last_modified_of(blog: dict) -> datetime:
+    """
+    Function to get the last modification time of a blog.
+
+    Blogs written before updated_at existed fall back to the creation time
+    stored in their ObjectId.
+    """
+    updated_at = blog.get("updated_at")
+    if updated_at is None:
+        return blog["_id"].generation_time
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return updated_at
+
+
+def blog_validators(blogs: Iterable[dict], variant: str = "") -> Tuple[str, Optional[datetime]]:
+    """
+    Function to compute the ETag and Last-Modified of one or more blogs.
+
+    `variant` distinguishes representations of the same blogs, for example
+    different projections.
+    """
+    digest = hashlib.blake2b(variant.encode(), digest_size=12)
+    last_modified = None
+    for blog in blogs:
+        digest.update(f"|{blog['_id']}:{blog.get('version', 0)}".encode())
+        modified = last_modified_of(blog)
+        if last_modified is None or modified > last_modified:
+            last_modified = modified
+    return f'"{digest.hexdigest()}"', last_modified
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Function to evaluate If-None-Match and If-Modified-Since against a resource.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, If-Modified-Since is ignored when If-None-Match is sent
+        tags = [tag.strip().removeprefix("W/")
+                for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def cache_headers(route_name: str, etag: str, last_modified: Optional[datetime]) -> dict:
+    """
+    Function to build the caching headers of a response.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True)
+    cache_control = settings.cache_control.get(route_name)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
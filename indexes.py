@@ -0,0 +1,184 @@
+import logging
+from typing import Dict, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Index options compared when checking an existing index for drift
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression",
+                    "expireAfterSeconds", "weights", "default_language")
+
+# Declarative registry of the indexes each collection should have
+INDEXES: Dict[str, List[IndexModel]] = {
+    "Users": [
+        # Login lookups and the duplicate check on registration
+        IndexModel([("username", ASCENDING)], name="username_1",
+                   unique=settings.unique_user_indexes),
+        IndexModel([("email", ASCENDING)], name="email_1",
+                   unique=settings.unique_user_indexes),
+    ],
+    "Blogs": [
+        # Author checks on update and delete
+        IndexModel([("author", ASCENDING)], name="author_1"),
+        # Dashboard feed range scans per tag set
+        IndexModel([("tag_key", ASCENDING), ("_id", ASCENDING)],
+                   name="tag_key_1__id_1"),
+        # Full-text search, title matches rank above content matches
+        IndexModel([("title", TEXT), ("content", TEXT)],
+                   name="title_text_content_text",
+                   weights={"title": 5, "content": 1},
+                   default_language="english"),
+    ],
+    "TagBuckets": [
+        # Trending tags read the most recent buckets
+        IndexModel([("bucket", ASCENDING)], name="bucket_1"),
+    ],
+}
+
+
+def _normalized_key(index: dict) -> list:
+    """
+    Function to get the key of an index in a comparable form.
+
+    The server reports a text index as _fts/_ftsx with its fields in the
+    weights, so text fields are folded into a single sorted entry.
+    """
+    key = index["key"]
+    key = [tuple(item) for item in (key.items() if isinstance(key, dict) else key)]
+    text_fields = [field for field, direction in key if direction == "text"]
+    if not text_fields:
+        return key
+
+    if ("_fts", "text") in key:
+        text_fields = list(index.get("weights", {}))
+    normalized = [(field, direction) for field, direction in key
+                  if direction != "text" and field != "_ftsx"]
+    return normalized + [("$text", tuple(sorted(text_fields)))]
+
+
+def _index_drift(expected: dict, current: dict) -> List[str]:
+    """
+    Function to list the differences between an expected and an existing index.
+    """
+    differences = []
+    expected_key = _normalized_key(expected)
+    current_key = _normalized_key(current)
+    if expected_key != current_key:
+        differences.append(f"key {current_key} != {expected_key}")
+    if expected["name"] != current["name"]:
+        differences.append(f"name {current['name']} != {expected['name']}")
+    for option in COMPARED_OPTIONS:
+        # An option set to False is the same as leaving it out
+        expected_value = expected.get(option)
+        current_value = current.get(option)
+        if expected_value is False:
+            expected_value = None
+        if current_value is False:
+            current_value = None
+        if expected_value != current_value:
+            differences.append(
+                f"{option} {current_value!r} != {expected_value!r}")
+    return differences
+
+
+async def _has_duplicates(collection, index: dict) -> bool:
+    """
+    Function to check whether the documents would break a unique index.
+    """
+    fields = [field for field, _ in _normalized_key(index)]
+    match = dict(index.get("partialFilterExpression", {}))
+    if index.get("sparse"):
+        match.update({field: {"$exists": True} for field in fields})
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields},
+                    "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1},
+    ]
+    return bool(await collection.aggregate(pipeline, allowDiskUse=True).to_list(1))
+
+
+async def _replace_index(collection, model: IndexModel, current: dict):
+    """
+    Function to replace a drifted index with the registry one.
+
+    The server keeps a single index per key, name and text index, so the
+    replacement cannot be built next to the drifted index. A unique index
+    is checked for duplicates before anything is dropped, and the old
+    index is rebuilt if the new one still fails.
+    """
+    expected = model.document
+    if expected.get("unique") and await _has_duplicates(collection, expected):
+        raise OperationFailure(
+            f"duplicate values block the unique index, {current['name']} was kept")
+
+    await collection.drop_index(current["name"])
+    try:
+        await collection.create_indexes([model])
+    except OperationFailure:
+        options = {option: value for option, value in current.items()
+                   if option not in ("key", "v", "ns")}
+        await collection.create_indexes([IndexModel(current["key"], **options)])
+        raise
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase, fix_drift: bool = False) -> dict:
+    """
+    Function to reconcile the database with the index registry.
+
+    Missing indexes are created and drifted ones are reported. With
+    `fix_drift` the drifted indexes are replaced, and one whose replacement
+    fails to build is kept.
+    """
+    report = {"created": [], "drifted": [], "failed": []}
+    for collection_name, models in INDEXES.items():
+        collection = db.get_collection(collection_name)
+        existing = await collection.index_information()
+
+        for model in models:
+            expected = model.document
+            label = f"{collection_name}.{expected['name']}"
+
+            # Find the existing index by name, or by key under another name
+            current = existing.get(expected["name"])
+            if current is not None:
+                current = dict(current, name=expected["name"])
+            else:
+                for name, info in existing.items():
+                    if _normalized_key(info) == _normalized_key(expected):
+                        current = dict(info, name=name)
+                        break
+
+            try:
+                if current is None:
+                    await collection.create_indexes([model])
+                    report["created"].append(label)
+                    continue
+
+                differences = _index_drift(expected, current)
+                if not differences:
+                    continue
+
+                report["drifted"].append(label)
+                logger.warning("Index %s drifted: %s",
+                               label, "; ".join(differences))
+                if fix_drift:
+                    await _replace_index(collection, model, current)
+            except OperationFailure as exc:
+                report["failed"].append(label)
+                logger.error("Could not apply index %s: %s", label, exc)
+
+    return report
+
+
+async def has_unique_user_indexes(db: AsyncIOMotorDatabase) -> bool:
+    """
+    Function to check that usernames and emails are unique in the Users indexes.
+    """
+    existing = await db.get_collection('Users').index_information()
+    unique_keys = [_normalized_key(info) for info in existing.values() if info.get("unique")]
+    return all([(field, ASCENDING)] in unique_keys for field in ("username", "email"))
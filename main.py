@@ -1,10 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from admission import AdmissionMiddleware
+from database import mongodb
+from indexes import ensure_indexes, has_unique_user_indexes
+from metrics import MetricsMiddleware
+from passwords import password_hasher
+from responses import MongoJSONResponse
+from settings import settings
+from write_behind import blog_write_batcher
 from routes.users import router as users_router
 from routes.blogs import router as blogs_router
 from routes.dashboard import router as dashboard_router
+from routes.metrics import router as metrics_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open the database client on startup and release resources on shutdown.
+    """
+    # Compressed content drops out of the text index, never lose search silently
+    if settings.content_compression is not None and not settings.content_compression_allow_unsearchable:
+        raise RuntimeError(
+            "content_compression leaves compressed content out of /blogs/search, "
+            "set content_compression_allow_unsearchable=true to accept it")
+    mongodb.connect()
+    password_hasher.start()
+    if settings.ensure_indexes_on_startup:
+        await ensure_indexes(mongodb.db)
+    # Registration relies on the unique indexes instead of a pre-check
+    if settings.unique_user_indexes and not await has_unique_user_indexes(mongodb.db):
+        raise RuntimeError(
+            "unique_user_indexes is on but the Users username/email indexes are not unique, "
+            "run `python manage.py ensure-indexes --fix-drift` first")
+    if settings.blog_write_behind:
+        blog_write_batcher.start(mongodb.db)
+    yield
+    # Drain the queued blog writes before closing the client
+    await blog_write_batcher.stop()
+    password_hasher.shutdown()
+    mongodb.close()
+
 
 # Create an instance of the FastAPI class
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 # Include the users_router in the app
 app.include_router(users_router)
@@ -14,3 +53,13 @@ app.include_router(blogs_router)
 
 # Include the dashboard_router in the app
 app.include_router(dashboard_router)
+
+# Shed requests beyond the capacity of their route class
+if settings.admission_control_enabled:
+    app.add_middleware(AdmissionMiddleware)
+
+# Include the metrics_router in the app and record request metrics
+if settings.metrics_enabled:
+    app.include_router(metrics_router)
+    app.add_middleware(MetricsMiddleware,
+                       server_timing=settings.server_timing_header)
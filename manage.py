@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+from compression import migrate_content
+from database import mongodb
+from feed import rebuild_feed
+from indexes import ensure_indexes
+from projection import backfill_excerpts
+from settings import settings
+from tag_stats import reconcile_tag_stats
+
+
+async def rebuild_feed_command(db, args):
+    """
+    Backfill tag keys and recount the dashboard tag sets.
+    """
+    await rebuild_feed(db)
+    print("Dashboard feed rebuilt")
+
+
+async def ensure_indexes_command(db, args):
+    """
+    Create missing indexes from the registry and report drifted ones.
+    """
+    report = await ensure_indexes(db, fix_drift=args.fix_drift)
+    for outcome, labels in report.items():
+        for label in labels:
+            print(f"{outcome}: {label}")
+    if report["failed"] or (report["drifted"] and not args.fix_drift):
+        raise SystemExit(1)
+
+
+async def backfill_excerpts_command(db, args):
+    """
+    Store the summary excerpt on blogs that do not have one yet.
+    """
+    updated = await backfill_excerpts(db)
+    print(f"Excerpts backfilled on {updated} blogs")
+
+
+async def reconcile_tag_stats_command(db, args):
+    """
+    Recount the tag counters from the blogs and report drift.
+    """
+    drift = await reconcile_tag_stats(db, fix=args.fix)
+    for line in drift:
+        print(line)
+    if not drift:
+        print("Tag counters are in sync")
+    elif args.fix:
+        print("Tag counters rebuilt")
+    else:
+        raise SystemExit(1)
+
+
+async def compress_content_command(db, args):
+    """
+    Store existing blog content compressed, or as text with --decompress.
+    """
+    codec = None if args.decompress else args.codec
+    if codec is not None and not settings.content_compression_allow_unsearchable:
+        raise SystemExit("Compressed content drops out of /blogs/search, "
+                         "set content_compression_allow_unsearchable=true to compress it")
+    migrated = await migrate_content(db, codec, min_bytes=args.min_bytes)
+    print(f"Content {'decompressed' if codec is None else 'compressed'} on {migrated} blogs")
+
+
+# Available commands and their handlers
+COMMANDS = {
+    "rebuild-feed": rebuild_feed_command,
+    "ensure-indexes": ensure_indexes_command,
+    "backfill-excerpts": backfill_excerpts_command,
+    "reconcile-tag-stats": reconcile_tag_stats_command,
+    "compress-content": compress_content_command,
+}
+
+
+async def run(args):
+    mongodb.connect()
+    try:
+        await COMMANDS[args.command](mongodb.db, args)
+    finally:
+        mongodb.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintenance commands for the FastBlog database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "rebuild-feed", help=rebuild_feed_command.__doc__.strip())
+    ensure_indexes_parser = subparsers.add_parser(
+        "ensure-indexes", help=ensure_indexes_command.__doc__.strip())
+    ensure_indexes_parser.add_argument(
+        "--fix-drift", action="store_true", help="Drop and recreate drifted indexes")
+    subparsers.add_parser(
+        "backfill-excerpts", help=backfill_excerpts_command.__doc__.strip())
+    reconcile_parser = subparsers.add_parser(
+        "reconcile-tag-stats", help=reconcile_tag_stats_command.__doc__.strip())
+    reconcile_parser.add_argument(
+        "--fix", action="store_true", help="Replace the counters with the fresh count")
+    compress_parser = subparsers.add_parser(
+        "compress-content", help=compress_content_command.__doc__.strip())
+    compress_parser.add_argument(
+        "--codec", choices=["zlib", "zstd"], default=settings.content_compression or "zlib",
+        help="Codec of the compressed content")
+    compress_parser.add_argument(
+        "--min-bytes", type=int, default=settings.content_compression_min_bytes,
+        help="Leave smaller content as text")
+    compress_parser.add_argument(
+        "--decompress", action="store_true", help="Store compressed content as text again")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
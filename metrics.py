@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Class to hold a Prometheus-style histogram
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+# Class to hold what a single request spent in the database
+
+
+class RequestStats:
+    __slots__ = ("scope", "db_commands", "db_seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_commands = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the scope
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+# Stats of the request being handled, copied into the Motor worker threads
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None)
+
+# Class to hold the metrics of the process
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.request_db_commands: Dict[Tuple[str, str], int] = {}
+        self.request_db_seconds: Dict[Tuple[str, str], float] = {}
+        self.commands: Dict[str, int] = {}
+        self.command_seconds: Dict[str, float] = {}
+        self.command_failures: Dict[str, int] = {}
+        self.values: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+    def observe_request(self, method: str, status_code: int, seconds: float, stats: RequestStats):
+        key = (method, stats.route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+
+        status_key = key + (status_code,)
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+        if stats.db_commands:
+            self.request_db_commands[key] = self.request_db_commands.get(
+                key, 0) + stats.db_commands
+            self.request_db_seconds[key] = self.request_db_seconds.get(
+                key, 0.0) + stats.db_seconds
+
+    def observe_command(self, command: str, seconds: float, failed: bool = False):
+        # Called from the Motor worker threads
+        with self.lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+            self.command_seconds[command] = self.command_seconds.get(
+                command, 0.0) + seconds
+            if failed:
+                self.command_failures[command] = self.command_failures.get(
+                    command, 0) + 1
+
+    def register_value(self, name: str, help_text: str, getter: Callable[[], float], kind: str = "gauge"):
+        """
+        Register a value read when the metrics are rendered.
+        """
+        self.values.append((name, kind, help_text, getter))
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+        """
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_duration_seconds Request latency per route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in list(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(
+                f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(
+                f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(
+                f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += ["# HELP http_responses_total Responses per route and status code.",
+                  "# TYPE http_responses_total counter"]
+        for (method, route, status_code), count in list(self.responses.items()):
+            lines.append(
+                f'http_responses_total{{method="{method}",route="{route}",status="{status_code}"}} {count}')
+
+        lines += ["# HELP http_request_db_commands_total MongoDB commands issued per route.",
+                  "# TYPE http_request_db_commands_total counter"]
+        for (method, route), count in list(self.request_db_commands.items()):
+            lines.append(
+                f'http_request_db_commands_total{{method="{method}",route="{route}"}} {count}')
+
+        lines += ["# HELP http_request_db_seconds_total Time spent in MongoDB per route.",
+                  "# TYPE http_request_db_seconds_total counter"]
+        for (method, route), seconds in list(self.request_db_seconds.items()):
+            lines.append(
+                f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+
+        with self.lock:
+            commands = list(self.commands.items())
+            command_seconds = list(self.command_seconds.items())
+            command_failures = list(self.command_failures.items())
+        lines += ["# HELP mongo_commands_total MongoDB commands per command name.",
+                  "# TYPE mongo_commands_total counter"]
+        lines += [f'mongo_commands_total{{command="{name}"}} {count}' for name, count in commands]
+        lines += ["# HELP mongo_command_seconds_total Time spent per MongoDB command name.",
+                  "# TYPE mongo_command_seconds_total counter"]
+        lines += [f'mongo_command_seconds_total{{command="{name}"}} {seconds}' for name, seconds in command_seconds]
+        lines += ["# HELP mongo_command_failures_total Failed MongoDB commands per command name.",
+                  "# TYPE mongo_command_failures_total counter"]
+        lines += [f'mongo_command_failures_total{{command="{name}"}} {count}' for name, count in command_failures]
+
+        for name, kind, help_text, getter in self.values:
+            lines += [f"# HELP {name} {help_text}",
+                      f"# TYPE {name} {kind}", f"{name} {getter()}"]
+
+        return "\n".join(lines) + "\n"
+
+
+# Create an instance of the Metrics class
+metrics = Metrics()
+
+# Class to attribute MongoDB commands to the request that issued them
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def _record(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        metrics.observe_command(event.command_name, seconds, failed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.db_commands += 1
+            stats.db_seconds += seconds
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+# Class to track the saturation of the driver connection pools
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.check_outs = 0
+        self.check_out_failures: Dict[str, int] = {}
+        self.cleared = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self.lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        # Timeouts here mean the pool is too small for the load
+        reason = str(event.reason)
+        with self.lock:
+            self.waiting -= 1
+            self.check_out_failures[reason] = self.check_out_failures.get(
+                reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.check_outs += 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+
+    def failures(self) -> int:
+        with self.lock:
+            return sum(self.check_out_failures.values())
+
+# ASGI middleware recording latency, in-flight requests and status codes
+
+
+class MetricsMiddleware:
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_metrics(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.db_commands} commands", app;dur={elapsed_ms:.2f}')
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.in_flight -= 1
+            metrics.observe_request(
+                scope["method"], status_code, time.perf_counter() - start, stats)
+            current_request.reset(token)
@@ -1,5 +1,14 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from bson import ObjectId
+from pydantic import AliasChoices, BaseModel, BeforeValidator, ConfigDict, EmailStr, Field
+from typing import Annotated, Optional, List
+
+
+def _object_id_to_str(value):
+    return str(value) if isinstance(value, ObjectId) else value
+
+
+# String field that also accepts a BSON ObjectId
+ObjectIdStr = Annotated[str, BeforeValidator(_object_id_to_str)]
 
 
 class UserBase(BaseModel):
@@ -18,6 +27,10 @@ class User(UserBase):
     hashed_password: str
 
 
+class UserProfile(UserBase):
+    id: ObjectIdStr = Field(validation_alias=AliasChoices("id", "_id"))
+
+
 class UserUpdateRequest(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -41,3 +54,53 @@ class Blog(BaseModel):
     content: str
     author: str
     tags: Optional[List[str]] = []
+
+
+class BlogResponse(BaseModel):
+    # Every field but the id is optional as reads may project them away
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: ObjectIdStr = Field(alias="_id")
+    title: Optional[str] = None
+    content: Optional[str] = None
+    author: Optional[str] = None
+    tags: Optional[List[str]] = None
+    excerpt: Optional[str] = None
+
+
+class DashboardBlogResponse(BlogResponse):
+    commonTagsCount: int
+
+
+class SearchBlogResponse(BlogResponse):
+    score: float
+
+
+class BulkBlogError(BaseModel):
+    index: int
+    error: str
+
+
+class BulkCreateResponse(BaseModel):
+    inserted: int
+    blog_ids: List[str]
+    errors: List[BulkBlogError]
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+
+
+class BatchGetResponse(BaseModel):
+    blogs: List[BlogResponse]
+    not_found: List[str]
+
+
+class TagStat(BaseModel):
+    tag: str
+    count: int
+
+
+class TrendingTag(TagStat):
+    previous_count: int
+    growth: int
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from configs.auth_config import bcrypt_context
+from settings import settings
+
+# Class to run bcrypt hashing and verification off the event loop
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """
+        Create the worker pool, called on app startup.
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="password-hasher")
+
+    async def _run(self, fn, *args):
+        if self.executor is None:
+            raise RuntimeError("The password hasher is not started")
+
+        # Fail fast instead of queueing more work than the pool can drain
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending authentication requests",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password on the worker pool.
+        """
+        return await self._run(bcrypt_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """
+        Verify a password against its hash on the worker pool.
+        """
+        return await self._run(bcrypt_context.verify, password, hashed_password)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.executor = None
+
+
+# Create an instance of the PasswordHasher class
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
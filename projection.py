@@ -0,0 +1,73 @@
+from typing import Optional
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from feed import INTERNAL_FIELDS_PROJECTION
+from compression import CONTENT_ENCODING_FIELD, inflate_content
+
+# Fields of a blog that can be requested with the fields parameter
+BLOG_FIELDS = ("title", "content", "author", "tags", "excerpt")
+
+# Fields returned by the summary view
+SUMMARY_FIELDS = ("title", "author", "tags", "excerpt")
+
+# Maximum length of the stored excerpt
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(content: str, length: int = EXCERPT_LENGTH) -> str:
+    """
+    Function to build the excerpt of a blog, cut at a word boundary.
+    """
+    if len(content) <= length:
+        return content
+    cut = content[:length].rsplit(None, 1)[0] or content[:length]
+    return cut.rstrip() + "..."
+
+
+def blog_projection(fields: Optional[str] = None, view: str = "full") -> dict:
+    """
+    Function to build the Mongo projection for a blog read.
+
+    `view=summary` returns the summary fields, otherwise `fields` is a comma
+    separated list of fields to return. The _id is always returned.
+    """
+    if view == "summary":
+        names = SUMMARY_FIELDS
+    elif fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in BLOG_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}",
+            )
+    else:
+        return dict(INTERNAL_FIELDS_PROJECTION)
+
+    projection = {name: 1 for name in names}
+    # Compressed content is decoded with its codec
+    if "content" in projection:
+        projection[CONTENT_ENCODING_FIELD] = 1
+    return projection
+
+
+async def backfill_excerpts(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> int:
+    """
+    Function to store the excerpt on blogs written before it existed.
+    """
+    collection = db.get_collection('Blogs')
+    updated = 0
+    updates = []
+    async for blog in collection.find({"excerpt": {"$exists": False}}, {"content": 1, CONTENT_ENCODING_FIELD: 1}):
+        inflate_content(blog)
+        updates.append(UpdateOne({"_id": blog["_id"]}, {
+                       "$set": {"excerpt": make_excerpt(blog.get("content", ""))}}))
+        if len(updates) >= batch_size:
+            await collection.bulk_write(updates, ordered=False)
+            updated += len(updates)
+            updates = []
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+        updated += len(updates)
+    return updated
@@ -0,0 +1,101 @@
+from abc import ABC, abstractmethod
+from typing import Any, Hashable, Optional
+from cache import TTLCache
+from settings import settings
+
+# Interface of the storage behind the response cache. A shared backend
+# (for example Redis) lets several workers see the same entries and
+# collection versions; it must serialize the cached documents itself.
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: Hashable) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Any):
+        ...
+
+    @abstractmethod
+    async def get_version(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    async def bump_version(self, namespace: str) -> int:
+        ...
+
+# In-process backend, entries expire after the TTL so writes made through
+# other workers are picked up within a bounded window
+
+
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int, ttl: float):
+        self.entries = TTLCache(max_size=max_entries, ttl=ttl)
+        self.versions = {}
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        return self.entries.get(key)
+
+    async def set(self, key: Hashable, value: Any):
+        self.entries.set(key, value)
+
+    async def get_version(self, namespace: str) -> int:
+        return self.versions.get(namespace, 0)
+
+    async def bump_version(self, namespace: str) -> int:
+        self.versions[namespace] = self.versions.get(namespace, 0) + 1
+        return self.versions[namespace]
+
+# Class to cache computed responses under a collection version
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    async def key(self, namespace: str, *parts: Hashable) -> tuple:
+        """
+        Build a cache key bound to the current version of the namespace.
+
+        Bumping the version makes every older key unreachable, so entries
+        go stale without scanning the cache.
+        """
+        return (namespace, await self.backend.get_version(namespace)) + parts
+
+    async def get(self, key: tuple) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: tuple, value: Any):
+        if self.enabled:
+            await self.backend.set(key, value)
+
+    async def invalidate(self, namespace: str):
+        """
+        Invalidate every entry of the namespace.
+
+        The version also keys the reads coalesced by single flight, so it
+        is bumped even when caching is disabled.
+        """
+        await self.backend.bump_version(namespace)
+
+
+# Namespace of the responses built from the Blogs collection
+BLOGS_NAMESPACE = "blogs"
+
+# Create an instance of the ResponseCache class
+response_cache = ResponseCache(
+    InMemoryCacheBackend(max_entries=settings.response_cache_max_entries,
+                         ttl=settings.response_cache_ttl_seconds),
+    enabled=settings.response_cache_enabled,
+)
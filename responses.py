@@ -0,0 +1,28 @@
+from typing import Any
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+
+def _default(value: Any) -> Any:
+    """
+    Function to encode the BSON types orjson does not know about.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dump_ndjson(content: Any) -> bytes:
+    """
+    Function to encode a document as one line of newline delimited JSON.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+
+
+# Response class rendering with orjson, datetimes are encoded natively
+
+
+class MongoJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -1,11 +1,29 @@
-from typing import List, Optional
+import anyio
+from typing import List, Literal, Optional
+from datetime import datetime, timezone
 from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from fastapi.responses import StreamingResponse
 
 from auth import UserDependency
-from dependencies import DatabaseDependency
-from models import Blog, User
+from settings import settings
+from dependencies import DatabaseDependency, ReadDatabaseDependency
+from models import BatchGetRequest, BatchGetResponse, Blog, BlogResponse, BulkBlogError, BulkCreateResponse, SearchBlogResponse, TagStat, TrendingTag, User
+from blog_writes import blog_deleted, blog_updated, blogs_created, new_blog_document
+from feed import INTERNAL_FIELDS_PROJECTION, tag_key
+from compression import CONTENT_ENCODING_FIELD, inflate_blogs, inflate_content, stored_content
+from projection import blog_projection, make_excerpt
+from http_cache import VALIDATOR_PROJECTION, blog_validators, cache_headers, has_conditional_headers, is_not_modified, with_validator_fields
+from tag_stats import get_tag_stats, get_trending_tags
+from response_cache import BLOGS_NAMESPACE, response_cache
+from singleflight import single_flight
+from responses import dump_ndjson
+from write_behind import blog_write_batcher
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 # Create a router for the blogs
 router = APIRouter(prefix="/blogs", tags=["blogs"])
@@ -21,57 +39,358 @@ async def create_blog(db: DatabaseDependency, blog: Blog, user: UserDependency):
     collection = db.get_collection('Blogs')
 
     # Add author information
-    blog_dict = blog.dict()
-    blog_dict["author"] = user.username
+    blog_dict = new_blog_document(blog, user.username)
+
+    # Hand the blog to the write batcher with a pre-generated id
+    if settings.blog_write_behind:
+        blog_dict["_id"] = ObjectId()
+        await blog_write_batcher.submit(blog_dict, acknowledged=settings.write_behind_acknowledged)
+        return {"message": "Blog created successfully", "blog_id": str(blog_dict["_id"])}
 
     # Insert the blog into the database
-    result = collection.insert_one(blog_dict)
+    result = await collection.insert_one(blog_dict)
+
+    # Add the blog to the feed and tag counters
+    await blogs_created(db, [blog_dict])
     return {"message": "Blog created successfully", "blog_id": str(result.inserted_id)}
 
 
+# Function to format the validation errors of a bulk item
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                     for error in exc.errors())
+
+
+# Endpoint to create many blogs at once
+@router.post("/bulk", summary="Create many blogs at once", response_description="Blogs created", response_model=BulkCreateResponse)
+async def bulk_create_blogs(db: DatabaseDependency, request: Request, user: UserDependency):
+    """
+    Endpoint to create many blogs at once.
+
+    The body is either a JSON array of blogs or, with the
+    application/x-ndjson content type, one blog per line streamed as it is
+    read. Blogs are validated one by one and inserted in unordered batches,
+    invalid or rejected items are reported by their index. A JSON array
+    over the item limit is refused before anything is stored, an NDJSON
+    body is read up to the limit and the first skipped line is reported.
+    """
+    # Get the collection
+    collection = db.get_collection('Blogs')
+
+    blog_ids = []
+    errors = []
+    batch = []
+
+    async def flush():
+        # Insert the batch, skipping the documents the server rejects
+        rejected = {}
+        try:
+            await collection.insert_many([document for _, document in batch], ordered=False)
+        except BulkWriteError as exc:
+            for write_error in exc.details.get("writeErrors", []):
+                rejected[write_error["index"]] = write_error.get("errmsg", "Write failed")
+
+        inserted = []
+        for position, (index, document) in enumerate(batch):
+            if position in rejected:
+                errors.append(BulkBlogError(index=index, error=rejected[position]))
+            else:
+                inserted.append(document)
+                blog_ids.append(str(document["_id"]))
+        await blogs_created(db, inserted)
+        batch.clear()
+
+    async def add(index: int, parse):
+        try:
+            blog = parse()
+        except ValidationError as exc:
+            errors.append(BulkBlogError(index=index, error=_validation_message(exc)))
+            return
+
+        document = new_blog_document(blog, user.username)
+        document["_id"] = ObjectId()
+        batch.append((index, document))
+        if len(batch) >= settings.bulk_insert_batch_size:
+            await flush()
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # Validate and insert the lines as they arrive, up to the item limit
+        index = 0
+        buffer = b""
+        truncated = False
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    if index >= settings.bulk_max_items:
+                        truncated = True
+                        break
+                    await add(index, lambda: Blog.model_validate_json(line))
+                    index += 1
+            if truncated:
+                break
+        if not truncated and buffer.strip():
+            if index >= settings.bulk_max_items:
+                truncated = True
+            else:
+                await add(index, lambda: Blog.model_validate_json(buffer))
+
+        # Stop reading past the limit, the blogs before it are kept
+        if truncated:
+            errors.append(BulkBlogError(
+                index=index,
+                error=f"At most {settings.bulk_max_items} blogs per request, "
+                      "this blog and the rest of the body were skipped"))
+    else:
+        try:
+            items = await request.json()
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Body must be a JSON array of blogs",
+            )
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Body must be a JSON array of blogs",
+            )
+        # Refuse an oversized array before storing any of it
+        if len(items) > settings.bulk_max_items:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {settings.bulk_max_items} blogs per request",
+            )
+        for index, item in enumerate(items):
+            await add(index, lambda: Blog.model_validate(item))
+
+    if batch:
+        await flush()
+
+    return BulkCreateResponse(inserted=len(blog_ids), blog_ids=blog_ids,
+                              errors=sorted(errors, key=lambda error: error.index))
+
+
+# Endpoint to retrieve many blogs by ID
+@router.post("/batch-get", summary="Retrieve many blogs by ID", response_description="Blogs retrieved successfully", response_model=BatchGetResponse, response_model_exclude_unset=True)
+async def batch_get_blogs(db: ReadDatabaseDependency, request_body: BatchGetRequest, fields: Optional[str] = None, view: Literal["full", "summary"] = "full"):
+    """
+    Endpoint to retrieve many blogs by ID with a single query.
+
+    Blogs are returned in the requested order, unknown IDs are listed in
+    `not_found`.
+    """
+    # Check the number of requested IDs
+    if len(request_body.ids) > settings.batch_get_max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.batch_get_max_ids} IDs per request",
+        )
+
+    # Get the collection
+    collection = db.get_collection('Blogs')
+
+    # Retrieve every valid ID with one query
+    requested_ids = list(dict.fromkeys(request_body.ids))
+    object_ids = [ObjectId(blog_id) for blog_id in requested_ids if ObjectId.is_valid(blog_id)]
+    blogs_by_id = {}
+    if object_ids:
+        async for blog in collection.find({"_id": {"$in": object_ids}}, blog_projection(fields, view)):
+            blogs_by_id[str(blog["_id"])] = inflate_content(blog)
+
+    return {
+        "blogs": [blogs_by_id[blog_id] for blog_id in requested_ids if blog_id in blogs_by_id],
+        "not_found": [blog_id for blog_id in requested_ids if blog_id not in blogs_by_id],
+    }
+
+
+# Endpoint to export blogs as NDJSON
+@router.get("/export", summary="Export blogs as NDJSON", response_description="Blogs streamed as NDJSON")
+async def export_blogs(db: ReadDatabaseDependency, tag: Optional[List[str]] = Query(None), author: Optional[str] = None, fields: Optional[str] = None, view: Literal["full", "summary"] = "full"):
+    """
+    Endpoint to stream blogs as newline delimited JSON.
+
+    Documents are read from a batched cursor and written as they arrive,
+    so memory stays constant whatever the size of the collection. Filter
+    with one or more `tag` values and an `author`.
+    """
+    # Get the collection
+    collection = db.get_collection('Blogs')
+
+    # Build the filter
+    query = {}
+    if tag:
+        query["tags"] = {"$in": tag}
+    if author is not None:
+        query["author"] = author
+
+    blogs_cursor = collection.find(query, blog_projection(fields, view)).batch_size(
+        settings.export_batch_size)
+
+    async def stream_blogs():
+        try:
+            async for blog in blogs_cursor:
+                yield dump_ndjson(inflate_content(blog))
+        finally:
+            # Runs when the client disconnects and the stream is cancelled,
+            # shielded so the close is not cancelled along with it
+            with anyio.CancelScope(shield=True):
+                await blogs_cursor.close()
+
+    return StreamingResponse(stream_blogs(), media_type="application/x-ndjson")
+
+
+# Endpoint to search blogs
+@router.get("/search", summary="Search blogs by title and content", response_description="Matching blogs retrieved successfully", response_model=List[SearchBlogResponse], response_model_exclude_unset=True)
+async def search_blogs(db: ReadDatabaseDependency, q: str, page: int = 1, limit: int = 10, fields: Optional[str] = None, view: Literal["full", "summary"] = "full"):
+    """
+    Endpoint to search blogs by title and content, best matches first.
+
+    Backed by the text index on title and content, title matches weigh
+    more. Quote phrases and prefix terms with a minus to exclude them.
+    Blogs stored with compressed content only match on their title.
+    """
+    # Check the query
+    if not q.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must not be empty",
+        )
+
+    # Get the collection
+    collection = db.get_collection('Blogs')
+
+    # Rank the matches by their text score
+    projection = dict(blog_projection(fields, view), score={"$meta": "textScore"})
+    blogs_cursor = collection.find({"$text": {"$search": q}}, projection).sort(
+        [("score", {"$meta": "textScore"})]).skip((page - 1) * limit).limit(limit)
+
+    return inflate_blogs(await blogs_cursor.to_list(length=limit))
+
+
+# Endpoint to retrieve the number of blogs per tag
+@router.get("/tags/stats", summary="Number of blogs per tag", response_description="Tag statistics retrieved successfully", response_model=List[TagStat])
+async def get_tag_statistics(db: ReadDatabaseDependency):
+    """
+    Endpoint to retrieve the number of blogs per tag, most used first.
+    """
+    return await get_tag_stats(db)
+
+
+# Endpoint to retrieve the trending tags
+@router.get("/tags/trending", summary="Trending tags", response_description="Trending tags retrieved successfully", response_model=List[TrendingTag])
+async def get_trending(db: ReadDatabaseDependency, hours: int = Query(24, ge=1, le=24 * 30), limit: int = Query(10, ge=1)):
+    """
+    Endpoint to rank the tags by the blogs created in the last `hours`.
+
+    `growth` compares the window with the one right before it.
+    """
+    return await get_trending_tags(db, hours, limit)
+
+
 # Endpoint to retrieve all blogs with pagination
-@router.get("/", summary="Retrieve all blogs with pagination", response_description="List of blogs retrieved successfully")
-async def get_all_blogs(db: DatabaseDependency, page: int = 1, limit: int = 10):
+@router.get("/", summary="Retrieve all blogs with pagination", response_description="List of blogs retrieved successfully", response_model=List[BlogResponse], response_model_exclude_unset=True)
+async def get_all_blogs(db: ReadDatabaseDependency, request: Request, response: Response, page: int = 1, limit: int = 10, cursor: Optional[str] = None, fields: Optional[str] = None, view: Literal["full", "summary"] = "full"):
     """
     Endpoint to retrieve all blogs with pagination.
-    """
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
 
+    Pass the X-Next-Cursor header of a page as `cursor` to fetch the next
+    page with an indexed range seek instead of skipping over earlier pages.
+    Use `view=summary` or a comma separated `fields` list to trim the blogs.
+    """
     # Get the collection
     collection = db.get_collection('Blogs')
 
-    # Retrieve all blogs
-    blogs_cursor = collection.find().skip(skip).limit(limit)
+    # Only fetch the requested fields
+    projection = blog_projection(fields, view)
+
+    # Seek past the last blog of the previous page, or fall back to skip
+    after = decode_cursor(cursor)
+    query = {"_id": {"$gt": after["id"]}} if after is not None else {}
+    skip = 0 if after is not None else (page - 1) * limit
+
+    def find_page(page_projection: dict):
+        return collection.find(query, page_projection).sort("_id", 1).skip(skip).limit(limit)
+
+    def not_modified_response(page_blogs: List[dict], headers: dict) -> Optional[Response]:
+        etag, last_modified = blog_validators(page_blogs, variant)
+        headers.update(cache_headers("get_all_blogs", etag, last_modified))
+        # Return the cursor of the next page if this one is full
+        if page_blogs and len(page_blogs) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(page_blogs[-1]["_id"])
+        if has_conditional_headers(request) and is_not_modified(request, etag, last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(headers))
+        return None
+
+    # Serve the page from the response cache if possible
+    variant = f"{fields}|{view}"
+    position = ("cursor", cursor) if cursor is not None else ("page", page)
+    cache_key = await response_cache.key(BLOGS_NAMESPACE, "list", position, limit, variant)
+    blogs = await response_cache.get(cache_key)
+
+    # Answer revalidations from the ids and versions of the page alone
+    if blogs is None and has_conditional_headers(request):
+        page_validators = await single_flight.do(
+            cache_key + ("validators",),
+            lambda: find_page(VALIDATOR_PROJECTION).to_list(length=limit))
+        not_modified = not_modified_response(page_validators, {})
+        if not_modified is not None:
+            return not_modified
 
     # Convert cursor to list of dictionaries
-    blogs = []
-    for blog in blogs_cursor:
-        # Convert ObjectId to string for serialization
-        blog['_id'] = str(blog['_id'])
-        blogs.append(blog)
+    if blogs is None:
+        async def load_page():
+            page_blogs = inflate_blogs(await find_page(with_validator_fields(projection)).to_list(length=limit))
+            await response_cache.set(cache_key, page_blogs)
+            return page_blogs
 
-    return blogs
+        # Concurrent identical requests share one database call
+        blogs = await single_flight.do(cache_key, load_page)
+
+    return not_modified_response(blogs, response.headers) or blogs
 
 
 # Endpoint to retrieve a specific blog by ID
-@router.get("/{blog_id}", summary="Retrieve a specific blog by ID", response_description="Blog retrieved successfully")
-async def get_blog_by_id(db: DatabaseDependency, blog_id: str):
+@router.get("/{blog_id}", summary="Retrieve a specific blog by ID", response_description="Blog retrieved successfully", response_model=BlogResponse, response_model_exclude_unset=True)
+async def get_blog_by_id(db: ReadDatabaseDependency, request: Request, response: Response, blog_id: str):
     """
     Endpoint to retrieve a specific blog by ID.
     """
     # Get the collection
     collection = db.get_collection('Blogs')
 
-    # Retrieve the blog by ID
-    blog = collection.find_one({"_id": ObjectId(blog_id)})
-    if blog:
-        return blog
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Blog not found",
-        )
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Blog not found",
+    )
+
+    # Shared reads are keyed by the blogs version, so a read made after a
+    # write never joins a load that started before it
+    flight_key = await response_cache.key(BLOGS_NAMESPACE, "blog", blog_id)
+
+    # Answer revalidations without loading the content
+    if has_conditional_headers(request):
+        blog = await single_flight.do(
+            flight_key + ("validators",),
+            lambda: collection.find_one({"_id": ObjectId(blog_id)}, VALIDATOR_PROJECTION))
+        if blog is None:
+            raise not_found
+        etag, last_modified = blog_validators([blog])
+        if is_not_modified(request, etag, last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers=cache_headers("get_blog_by_id", etag, last_modified))
+
+    async def load_blog():
+        return inflate_content(await collection.find_one({"_id": ObjectId(blog_id)}, INTERNAL_FIELDS_PROJECTION))
+
+    # Retrieve the blog by ID, sharing the call with concurrent identical requests
+    blog = await single_flight.do(flight_key, load_blog)
+    if blog is None:
+        raise not_found
+
+    etag, last_modified = blog_validators([blog])
+    response.headers.update(cache_headers("get_blog_by_id", etag, last_modified))
+    return blog
 
 
 # Endpoint to update an existing blog
@@ -83,25 +402,39 @@ async def update_blog(db: DatabaseDependency, blog_id: str, blog: Blog, user: Us
     # Get the collection
     collection = db.get_collection('Blogs')
 
-    # Check if the blog exists
-    if collection.find_one({"_id": ObjectId(blog_id)}):
-        # Check if the current user is the author of the blog
-        if collection.find_one({"_id": ObjectId(blog_id), "author": user.username}):
-            # Update the blog
-            collection.update_one({"_id": ObjectId(blog_id)}, {
-                                  "$set": blog.dict()})
-            return {"message": "Blog updated successfully"}
-        else:
+    # Update the blog only if the current user is its author
+    blog_dict = blog.dict()
+    blog_dict["tag_key"] = tag_key(blog_dict["tags"])
+    blog_dict["excerpt"] = make_excerpt(blog_dict["content"])
+    blog_dict.update(stored_content(blog_dict["content"]))
+    blog_dict["updated_at"] = datetime.now(timezone.utc)
+    update = {"$set": blog_dict, "$inc": {"version": 1}}
+    # Drop the codec of the previous content if this one is stored as text
+    if CONTENT_ENCODING_FIELD not in blog_dict:
+        update["$unset"] = {CONTENT_ENCODING_FIELD: ""}
+    previous_blog = await collection.find_one_and_update(
+        {"_id": ObjectId(blog_id), "author": user.username},
+        update,
+        projection={"tags": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    if previous_blog is None:
+        # Tell a missing blog apart from one owned by someone else
+        if await collection.find_one({"_id": ObjectId(blog_id)}, {"_id": 1}):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="You are not authorized to update this blog",
             )
-    else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Blog not found",
         )
 
+    # Move the blog to its new tag set in the feed and tag counters
+    await blog_updated(db, previous_blog["_id"], previous_blog.get("tags"), blog_dict["tags"])
+    return {"message": "Blog updated successfully"}
+
 
 # Endpoint to delete a blog
 @router.delete("/{blog_id}", summary="Delete blog", response_description="Blog deleted successfully")
@@ -112,20 +445,24 @@ async def delete_blog(db: DatabaseDependency, blog_id: str, user: UserDependency
     # Get the collection
     collection = db.get_collection('Blogs')
 
-    # Check if the blog exists
-    if collection.find_one({"_id": ObjectId(blog_id)}):
-        # Check if the current user is the author of the blog or an admin
-        if user.role == "admin" or collection.find_one({"_id": ObjectId(blog_id), "author": user.username}):
-            # Delete the blog
-            collection.delete_one({"_id": ObjectId(blog_id)})
-            return {"message": "Blog deleted successfully"}
-        else:
+    # Delete the blog only if the current user is its author or an admin
+    query = {"_id": ObjectId(blog_id)}
+    if user.role != "admin":
+        query["author"] = user.username
+    deleted_blog = await collection.find_one_and_delete(query, projection={"tags": 1})
+
+    if deleted_blog is None:
+        # Tell a missing blog apart from one owned by someone else
+        if await collection.find_one({"_id": ObjectId(blog_id)}, {"_id": 1}):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="You are not authorized to delete this blog",
             )
-    else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Blog not found",
         )
+
+    # Remove the blog from the feed and tag counters
+    await blog_deleted(db, deleted_blog["_id"], deleted_blog.get("tags"))
+    return {"message": "Blog deleted successfully"}
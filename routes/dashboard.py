@@ -1,10 +1,17 @@
 # Import necessary modules and classes
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Response
+from typing import List, Literal, Optional
 
 # Import dependencies
 from auth import UserDependency
-from dependencies import DatabaseDependency
+from dependencies import ReadDatabaseDependency
+from models import DashboardBlogResponse
+from feed import get_feed_page
+from compression import inflate_blogs
+from projection import blog_projection
+from response_cache import BLOGS_NAMESPACE, response_cache
+from singleflight import single_flight
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 # Create API router instance for dashboard
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
@@ -12,50 +19,51 @@ router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 # Define endpoint to retrieve blogs based on user's interests
 
 
-@router.get("/", summary="Retrieve blogs with tags user is interested in", response_description="List of blogs retrieved successfully")
-async def get_dashboard_blogs(db: DatabaseDependency, user: UserDependency, page: int = 1, limit: int = 10) -> List[dict]:
+@router.get("/", summary="Retrieve blogs with tags user is interested in", response_description="List of blogs retrieved successfully", response_model=List[DashboardBlogResponse], response_model_exclude_unset=True)
+async def get_dashboard_blogs(db: ReadDatabaseDependency, user: UserDependency, response: Response, page: int = 1, limit: int = 10, cursor: Optional[str] = None, fields: Optional[str] = None, view: Literal["full", "summary"] = "full"):
     """
     Retrieve paginated blogs from the database based on user's interests.
+
+    Blogs are ordered by the number of tags they share with the user, then
+    by _id. Pass the X-Next-Cursor header of a page as `cursor` to continue
+    after its last blog instead of skipping over earlier pages. Use
+    `view=summary` or a comma separated `fields` list to trim the blogs.
     """
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
-
-    # Get collection from database
-    collection = db.get_collection('Blogs')
-
-    # Construct MongoDB aggregation pipeline for querying blogs
-    pipeline = [
-        {
-            "$match": {
-                "tags": {"$in": user.tags}
-            }
-        },
-        {
-            "$addFields": {  # Project the count of common tags
-                "commonTagsCount": {
-                    "$size": {
-                        "$setIntersection": ["$tags", user.tags]
-                    }
-                }
-            }
-        },
-        {
-            "$sort": {  # Sort in descending order of common tags count
-                "commonTagsCount": -1
-            }
-        },
-        {"$skip": skip},
-        {"$limit": limit}
-    ]
-
-    # Fetch paginated blogs from the database
-    paginated_blogs = collection.aggregate(pipeline)
-
-    # Convert MongoDB cursor to a list of dictionaries
-    paginated_blogs_list = [blog for blog in paginated_blogs]
+    # Continue after the last blog of the previous page, or fall back to skip
+    after = decode_cursor(cursor)
+    if after is not None and not isinstance(after.get("c"), int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Only fetch the requested fields
+    projection = blog_projection(fields, view)
+
+    # Users with the same tag set share the same pages
+    position = ("cursor", cursor) if cursor is not None else ("page", page)
+    cache_key = await response_cache.key(
+        BLOGS_NAMESPACE, "dashboard", tuple(sorted(set(user.tags))), position, limit, fields, view)
+    paginated_blogs_list = await response_cache.get(cache_key)
+
+    # Assemble the page from the precomputed tag set posting lists
+    if paginated_blogs_list is None:
+        async def load_page():
+            # The cursor alone positions the page, page is ignored with it
+            feed_page = inflate_blogs(await get_feed_page(
+                db, user.tags, limit, skip=0 if after is not None else (page - 1) * limit,
+                after=after, projection=projection))
+            await response_cache.set(cache_key, feed_page)
+            return feed_page
+
+        # Concurrent identical requests share one database call
+        paginated_blogs_list = await single_flight.do(cache_key, load_page)
 
     # If no blogs found, raise HTTPException
     if not paginated_blogs_list:
         raise HTTPException(status_code=404, detail="No blogs found")
 
+    # Return the cursor of the next page if this one is full
+    if len(paginated_blogs_list) == limit:
+        last_blog = paginated_blogs_list[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            last_blog["_id"], c=last_blog["commonTagsCount"])
+
     return paginated_blogs_list
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from admission import admission
+from auth import UserDependency, token_cache, user_cache
+from database import mongodb
+from metrics import metrics
+from passwords import password_hasher
+from settings import settings
+from response_cache import response_cache
+from singleflight import single_flight
+from write_behind import blog_write_batcher
+
+# Create a router for the metrics
+router = APIRouter(tags=["metrics"])
+
+# Values owned by other modules, read when the metrics are scraped
+metrics.register_value("user_cache_hits_total", "Authenticated user cache hits.",
+                       lambda: user_cache.hits, kind="counter")
+metrics.register_value("user_cache_misses_total", "Authenticated user cache misses.",
+                       lambda: user_cache.misses, kind="counter")
+metrics.register_value("token_cache_hits_total", "Verified token cache hits.",
+                       lambda: token_cache.hits, kind="counter")
+metrics.register_value("token_cache_misses_total", "Verified token cache misses.",
+                       lambda: token_cache.misses, kind="counter")
+metrics.register_value("password_hash_pending", "Password hashing operations queued or running.",
+                       lambda: password_hasher.pending)
+metrics.register_value("password_hash_rejected_total", "Password hashing operations rejected with 503.",
+                       lambda: password_hasher.rejected, kind="counter")
+metrics.register_value("response_cache_hits_total", "Listing and dashboard response cache hits.",
+                       lambda: response_cache.hits, kind="counter")
+metrics.register_value("response_cache_misses_total", "Listing and dashboard response cache misses.",
+                       lambda: response_cache.misses, kind="counter")
+
+metrics.register_value("single_flight_executed_total", "Read calls executed against the database.",
+                       lambda: single_flight.executed, kind="counter")
+metrics.register_value("single_flight_coalesced_total", "Read calls served by an identical call in flight.",
+                       lambda: single_flight.coalesced, kind="counter")
+
+metrics.register_value("blog_write_queue_depth", "Blogs waiting in the write-behind queue.",
+                       lambda: blog_write_batcher.queue.qsize() if blog_write_batcher.queue else 0)
+metrics.register_value("blog_write_batches_total", "Write-behind batches flushed.",
+                       lambda: blog_write_batcher.flushed_batches, kind="counter")
+metrics.register_value("blog_write_documents_total", "Blogs stored by the write-behind batcher.",
+                       lambda: blog_write_batcher.flushed_documents, kind="counter")
+metrics.register_value("blog_write_failures_total", "Blogs the write-behind batcher failed to store.",
+                       lambda: blog_write_batcher.failed_documents, kind="counter")
+
+metrics.register_value("mongo_pool_max_size", "Maximum connections per server pool.",
+                       lambda: settings.mongo_max_pool_size)
+metrics.register_value("mongo_pool_connections", "Open connections across the server pools.",
+                       lambda: mongodb.pool_listener.open)
+metrics.register_value("mongo_pool_checked_out", "Connections checked out of the pools.",
+                       lambda: mongodb.pool_listener.checked_out)
+metrics.register_value("mongo_pool_waiting", "Operations waiting for a pool connection.",
+                       lambda: mongodb.pool_listener.waiting)
+metrics.register_value("mongo_pool_check_outs_total", "Connections checked out of the pools.",
+                       lambda: mongodb.pool_listener.check_outs, kind="counter")
+metrics.register_value("mongo_pool_check_out_timeouts_total", "Check outs that timed out waiting for a connection.",
+                       lambda: mongodb.pool_listener.check_out_failures.get("timeout", 0), kind="counter")
+metrics.register_value("mongo_pool_check_out_failures_total", "Check outs that failed for any reason.",
+                       mongodb.pool_listener.failures, kind="counter")
+metrics.register_value("mongo_pool_cleared_total", "Pools cleared after a network error or failover.",
+                       lambda: mongodb.pool_listener.cleared, kind="counter")
+
+for name, limiter in admission.limiters.items():
+    metrics.register_value(f"admission_{name}_active", f"Requests of the {name} class running.",
+                           lambda limiter=limiter: limiter.active)
+    metrics.register_value(f"admission_{name}_waiting", f"Requests of the {name} class waiting for a slot.",
+                           lambda limiter=limiter: limiter.waiting)
+    metrics.register_value(f"admission_{name}_shed_total", f"Requests of the {name} class shed with 503.",
+                           lambda limiter=limiter: limiter.shed, kind="counter")
+metrics.register_value("rate_limited_total", "Requests refused with 429 by the rate limiter.",
+                       lambda: admission.rate_limited, kind="counter")
+
+
+# Endpoint to expose the metrics to Prometheus
+@router.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """
+    Endpoint to expose the metrics in the Prometheus text format.
+    """
+    return metrics.render()
+
+
+# Endpoint to list the slow queries captured in debug mode
+@router.get("/metrics/slow-queries", summary="Slow queries with their explain plans", response_description="Slow queries retrieved successfully")
+async def get_slow_queries(user: UserDependency):
+    """
+    Endpoint to list the most recent slow queries, admin only.
+    """
+    # Check if current user is an admin
+    if user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You do not have permission to perform this action",
+        )
+
+    # Check if the debug mode is enabled
+    if mongodb.slow_query_detector is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Slow query debug mode is disabled",
+        )
+
+    return list(reversed(mongodb.slow_query_detector.records))
@@ -1,4 +1,4 @@
-from datetime import timedelta, datetime
+import time
 from typing import Annotated, Optional
 from pydantic import EmailStr
 from bson import ObjectId
@@ -6,17 +6,22 @@ from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from configs.auth_config import bcrypt_context
+from passwords import password_hasher
 from jose import jwt, JWTError
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from settings import settings
 from dependencies import DatabaseDependency, TokenDependency
-from auth import UserDependency
-from models import CreateUserRequest, User, UserUpdateRequest
+from auth import UserDependency, invalidate_cached_user, user_cache, user_from_document
+from models import CreateUserRequest, User, UserProfile, UserUpdateRequest
 
 # Create a router for the users
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Lifetime of an access token
+ACCESS_TOKEN_EXPIRE_SECONDS = 15 * 60
+
 
 # Endpoint to register a new user
 @router.post("/register", summary="Register a new user", response_description="User created successfully")
@@ -27,17 +32,21 @@ async def create_user(db: DatabaseDependency, create_user_request: CreateUserReq
     # Get the collection
     collection = db.get_collection('Users')
 
-    # Check if email already exists
-    existing_user = collection.find_one({"$or": [{"email": create_user_request.email}, {
-                                        "username": create_user_request.username}]})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+    already_registered = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered",
+    )
+
+    # Check if email already exists, the unique indexes checked on startup
+    # enforce this on insert otherwise
+    if not settings.unique_user_indexes:
+        existing_user = await collection.find_one({"$or": [{"email": create_user_request.email}, {
+                                            "username": create_user_request.username}]})
+        if existing_user:
+            raise already_registered
 
     # If email is unique, proceed with user creation
-    hashed_password = bcrypt_context.hash(create_user_request.password)
+    hashed_password = await password_hasher.hash(create_user_request.password)
     user_data = {
         "email": create_user_request.email,
         "username": create_user_request.username,
@@ -45,7 +54,10 @@ async def create_user(db: DatabaseDependency, create_user_request: CreateUserReq
         "role": create_user_request.role,
         "tags": create_user_request.tags,
     }
-    result = collection.insert_one(user_data)
+    try:
+        result = await collection.insert_one(user_data)
+    except DuplicateKeyError:
+        raise already_registered
     return {"message": "User created successfully", "user_id": str(result.inserted_id)}
 
 
@@ -56,7 +68,7 @@ async def login(db: DatabaseDependency, userdata: Annotated[OAuth2PasswordReques
     Endpoint to log in a user.
     """
     # Authenticate user
-    user = authenticate_user(db, userdata.username, userdata.password)
+    user = await authenticate_user(db, userdata.username, userdata.password)
 
     # Create access token
     access_token = create_access_token(data={"id": str(user["_id"])})
@@ -64,16 +76,16 @@ async def login(db: DatabaseDependency, userdata: Annotated[OAuth2PasswordReques
 
 
 # Endpoint to retrieve user profile
-@router.get("/profile", summary="Retrieve user profile", response_description="User profile retrieved successfully")
+@router.get("/profile", summary="Retrieve user profile", response_description="User profile retrieved successfully", response_model=UserProfile)
 async def get_profile(user: UserDependency):
     """
     Endpoint to retrieve user profile.
     """
-    return {"id": user.id, "username": user.username, "email": user.email, "role": user.role, "tags": user.tags}
+    return user
 
 
 # Endpoint to update a user's profile
-@router.patch("/profile", summary="Update user profile", response_description="Profile updated successfully")
+@router.patch("/profile", summary="Update user profile", response_description="Profile updated successfully", response_model=UserProfile)
 async def update_profile(db: DatabaseDependency, user: UserDependency, profile: UserUpdateRequest):
     """
     Endpoint to update a user's profile.
@@ -85,18 +97,25 @@ async def update_profile(db: DatabaseDependency, user: UserDependency, profile:
 
     # If password exists, hash it
     if "password" in profile_data:
-        profile_data["hashed_password"] = bcrypt_context.hash(
+        profile_data["hashed_password"] = await password_hasher.hash(
             profile_data.pop("password"))
 
-    # Update the user
+    # Update the user and read back the updated document
     collection = db.get_collection('Users')
-    collection.update_one(
-        {"_id": ObjectId(user.id)}, {"$set": profile_data})
+    try:
+        user = await collection.find_one_and_update(
+            {"_id": ObjectId(user.id)}, {"$set": profile_data},
+            return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered",
+        )
 
-    # Update the user object
-    user = collection.find_one({"_id": ObjectId(user.id)})
+    # Refresh the cached copy of the user
+    user_cache.set(str(user["_id"]), user_from_document(user))
 
-    return {"id": str(user["_id"]), "username": user["username"], "email": user["email"], "role": user["role"], "tags": user["tags"]}
+    return user
 
 
 # Endpoint to add tags to a user
@@ -116,8 +135,9 @@ async def add_tags(db: DatabaseDependency, user: UserDependency, tags: list[str]
         return {"message": "No new tags added"}
 
     # Add tags to the user
-    user = collection.update_one(
+    await collection.update_one(
         {"_id": ObjectId(user.id)}, {"$addToSet": {"tags": {"$each": tags}}})
+    invalidate_cached_user(user.id)
     return {"message": "Tags added successfully"}
 
 
@@ -131,8 +151,9 @@ async def remove_tags(db: DatabaseDependency, user: UserDependency, tags: list[s
     collection = db.get_collection('Users')
 
     # Remove tags from the user
-    user = collection.update_one(
+    await collection.update_one(
         {"_id": ObjectId(user.id)}, {"$pull": {"tags": {"$in": tags}}})
+    invalidate_cached_user(user.id)
     return {"message": "Tags removed successfully"}
 
 
@@ -167,13 +188,14 @@ async def update_role(db: DatabaseDependency, userId: str, user: UserDependency,
     collection = db.get_collection('Users')
 
     # Update the user's role
-    user = collection.update_one(
+    await collection.update_one(
         {"_id": ObjectId(userId)}, {"$set": {"role": role}})
+    invalidate_cached_user(userId)
     return {"message": "Role updated successfully"}
 
 
 # Function to authenticate a user
-def authenticate_user(db: DatabaseDependency, username: str, password: str) -> Optional[dict]:
+async def authenticate_user(db: DatabaseDependency, username: str, password: str) -> Optional[dict]:
     """
     Function to authenticate a user.
     """
@@ -181,8 +203,8 @@ def authenticate_user(db: DatabaseDependency, username: str, password: str) -> O
     collection = db.get_collection('Users')
 
     # Authenticate user
-    user = collection.find_one({"username": username})
-    if not user or not bcrypt_context.verify(password, user.get("hashed_password", "")):
+    user = await collection.find_one({"username": username})
+    if not user or not await password_hasher.verify(password, user.get("hashed_password", "")):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -198,7 +220,7 @@ def create_access_token(data: dict) -> str:
     """
     # Create a copy of the data and add an expiration time
     to_encode = data.copy()
-    expire = datetime.now() + timedelta(minutes=15)
+    expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
     to_encode.update({"exp": expire})
 
     # Encode the ObjectId to a string
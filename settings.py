@@ -1,3 +1,4 @@
+from typing import Dict, Literal, Optional
 from pydantic_settings import BaseSettings
 
 # Define the settings class
@@ -9,6 +10,105 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
 
+    # MongoDB client pool and timeouts, None keeps the driver default
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = None
+    mongo_connect_timeout_ms: int = 20000
+    mongo_socket_timeout_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: int = 30000
+    mongo_compressors: Optional[str] = None
+
+    # Read preference of the read-heavy routes, auth and writes always use
+    # the primary. Max staleness is -1 (no bound) or at least 90 seconds.
+    mongo_read_preference: Literal["primary", "primaryPreferred", "secondary",
+                                   "secondaryPreferred", "nearest"] = "primary"
+    mongo_max_staleness_seconds: int = -1
+
+    # Authenticated user cache, entries older than the TTL are refetched
+    user_cache_ttl_seconds: float = 30
+    user_cache_max_size: int = 10000
+
+    # Verified token cache, entries never outlive the token itself
+    token_cache_ttl_seconds: float = 900
+    token_cache_max_size: int = 10000
+
+    # Worker pool for bcrypt, requests beyond max pending get a 503
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64
+
+    # Index registry, applied on startup unless disabled. Unique user
+    # indexes replace the duplicate email/username pre-check on register,
+    # startup fails until they exist (ensure-indexes --fix-drift).
+    ensure_indexes_on_startup: bool = True
+    unique_user_indexes: bool = False
+
+    # Request metrics, exposed on /metrics and optionally in Server-Timing
+    metrics_enabled: bool = True
+    server_timing_header: bool = False
+
+    # Slow query debug mode, explains sampled commands above the threshold
+    slow_query_debug: bool = False
+    slow_query_threshold_ms: float = 100
+    slow_query_sample_rate: float = 1.0
+    slow_query_log_file: Optional[str] = "slow_queries.log"
+
+    # Response cache of listing and dashboard pages
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_ttl_seconds: float = 30
+
+    # Write-behind mode batching blog creation into insert_many calls.
+    # Unacknowledged writes return before the blog is stored.
+    blog_write_behind: bool = False
+    write_behind_acknowledged: bool = True
+    write_behind_batch_size: int = 100
+    write_behind_flush_interval_ms: float = 20
+    write_behind_max_queue: int = 10000
+
+    # Compressed storage of blog content at or above the size threshold,
+    # zstd needs the zstandard package. Compressed content is left out of
+    # the search index, only the title of those blogs is searchable, so
+    # the app refuses to compress unless unsearchable content is allowed.
+    content_compression: Optional[Literal["zlib", "zstd"]] = None
+    content_compression_min_bytes: int = 1024
+    content_compression_level: Optional[int] = None
+    content_compression_allow_unsearchable: bool = False
+
+    # Bulk ingestion and batch reads
+    bulk_insert_batch_size: int = 500
+    bulk_max_items: int = 10000
+    batch_get_max_ids: int = 100
+    export_batch_size: int = 500
+
+    # Admission control, requests past the concurrency limit of their route
+    # class wait up to the queue timeout and are then shed with a 503
+    admission_control_enabled: bool = True
+    admission_limits: Dict[str, int] = {
+        "auth": 16,
+        "heavy": 32,
+        "light": 256,
+        "write": 64,
+    }
+    admission_queue_timeout_ms: float = 2000
+    admission_max_waiting: int = 512
+    admission_retry_after_seconds: int = 1
+
+    # Token-bucket rate limits per user, or per IP for login and register
+    rate_limit_enabled: bool = False
+    rate_limit_per_second: float = 20
+    rate_limit_burst: int = 40
+    login_rate_limit_per_second: float = 0.5
+    login_rate_limit_burst: int = 10
+    rate_limit_max_clients: int = 100000
+
+    # Cache-Control header of cacheable routes, keyed by endpoint name
+    cache_control: Dict[str, str] = {
+        "get_all_blogs": "no-cache",
+        "get_blog_by_id": "no-cache",
+    }
+
     class Config:
         env_file = ".env"
 
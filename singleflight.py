@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Class to coalesce concurrent identical calls into a single execution
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` unless a call with the same key is already in flight, in
+        which case wait for that call and share its result.
+
+        Waiters must not mutate the shared result.
+        """
+        task = self.calls.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        # A cancelled waiter must not cancel the call the others are awaiting
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+
+# Create an instance of the SingleFlight class for the read paths
+single_flight = SingleFlight()
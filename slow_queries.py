@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from metrics import current_request
+
+logger = logging.getLogger(__name__)
+
+# Commands that can be explained
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct",
+                        "update", "delete", "findAndModify"}
+
+# Command fields added by the driver that explain does not accept
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference",
+                 "txnNumber", "apiVersion", "apiStrict", "apiDeprecationErrors",
+                 "cursor", "batchSize", "singleBatch"}
+
+
+def query_shape(value):
+    """
+    Function to replace the literal values of a query with placeholders.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+def plan_flags(explain: dict) -> list:
+    """
+    Function to collect the problematic stages of an explain plan.
+    """
+    flags = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            stage = node.get("stage")
+            if stage == "COLLSCAN":
+                flags.add("COLLSCAN")
+            elif stage == "SORT":
+                flags.add("IN_MEMORY_SORT")
+            if "$sort" in node and "stage" not in node:
+                flags.add("IN_MEMORY_SORT")
+            for item in node.values():
+                walk(item)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return sorted(flags)
+
+# Class to sample slow commands and capture their explain plans
+
+
+class SlowQueryDetector(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, sample_rate: float = 1.0, log_file: Optional[str] = None, max_records: int = 200):
+        self.threshold_micros = threshold_ms * 1000
+        self.sample_rate = sample_rate
+        self.records = deque(maxlen=max_records)
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.pending = {}
+
+        self.log = logging.getLogger(f"{__name__}.records")
+        if log_file:
+            handler = RotatingFileHandler(
+                log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
+            self.log.addHandler(handler)
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+
+    def start(self, client: AsyncIOMotorClient):
+        """
+        Start explaining sampled commands on the running event loop.
+        """
+        self.client = client
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=100)
+        self.task = asyncio.create_task(self._explain_worker())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.task = None
+        self.queue = None
+
+    def started(self, event):
+        # Keep the command body until it is known whether it was slow
+        if self.queue is None or event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        stats = current_request.get()
+        self.pending[(event.connection_id, event.request_id)] = (
+            event.database_name, event.command, stats.route if stats else None)
+
+    def succeeded(self, event):
+        started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_micros:
+            return
+        if random.random() >= self.sample_rate:
+            return
+
+        database_name, command, route = started
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "route": route,
+            "database": database_name,
+            "command": event.command_name,
+            "collection": command.get(event.command_name),
+            "duration_ms": event.duration_micros / 1000,
+            "shape": query_shape({key: value for key, value in command.items()
+                                  if key not in DRIVER_FIELDS and key != event.command_name}),
+        }
+        # The listener runs on a Motor worker thread
+        self.loop.call_soon_threadsafe(self._enqueue, record, command)
+
+    def failed(self, event):
+        self.pending.pop((event.connection_id, event.request_id), None)
+
+    def _enqueue(self, record: dict, command: dict):
+        try:
+            self.queue.put_nowait((record, command))
+        except asyncio.QueueFull:
+            pass
+
+    async def _explain_worker(self):
+        while True:
+            record, command = await self.queue.get()
+            explain_command = {key: value for key, value in command.items()
+                               if key not in DRIVER_FIELDS}
+            if record["command"] == "aggregate":
+                explain_command["cursor"] = {}
+            try:
+                explain = await self.client.get_database(record["database"]).command(
+                    {"explain": explain_command, "verbosity": "queryPlanner"})
+                record["flags"] = plan_flags(explain)
+            except Exception as exc:
+                record["flags"] = []
+                record["explain_error"] = str(exc)
+
+            self.records.append(record)
+            self.log.info(json.dumps(record, default=str))
@@ -0,0 +1,149 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+# Collection holding the number of blogs per tag
+TAG_STATS_COLLECTION = "TagStats"
+
+# Collection holding the number of blogs per tag and hour of creation
+TAG_BUCKETS_COLLECTION = "TagBuckets"
+
+# Pipeline counting the blogs per tag from scratch
+TAG_TOTALS_PIPELINE = [
+    {"$project": {"tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+    {"$unwind": "$tags"},
+    {"$group": {"_id": "$tags", "total": {"$sum": 1}}},
+]
+
+# Pipeline counting the blogs per tag and hour of creation from scratch
+TAG_BUCKETS_PIPELINE = [
+    {"$project": {
+        "tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]},
+        "bucket": {"$dateTrunc": {"date": {"$toDate": "$_id"}, "unit": "hour"}},
+    }},
+    {"$unwind": "$tags"},
+    {"$group": {"_id": {"tag": "$tags", "bucket": "$bucket"}, "count": {"$sum": 1}}},
+    {"$project": {"tag": "$_id.tag", "bucket": "$_id.bucket", "count": 1}},
+]
+
+# Pipelines replacing the counters with a fresh count
+REBUILD_TAG_STATS_PIPELINES = [
+    TAG_TOTALS_PIPELINE + [{"$out": TAG_STATS_COLLECTION}],
+    TAG_BUCKETS_PIPELINE + [{"$out": TAG_BUCKETS_COLLECTION}],
+]
+
+
+def bucket_of(blog_id: ObjectId) -> datetime:
+    """
+    Function to get the hourly bucket of a blog from its creation time.
+    """
+    return blog_id.generation_time.replace(minute=0, second=0, microsecond=0)
+
+
+async def record_tag_changes(db: AsyncIOMotorDatabase, changes: Iterable[Tuple[ObjectId, Optional[List[str]], Optional[List[str]]]]):
+    """
+    Function to apply the tag set differences of blog writes to the counters.
+
+    Each change is (blog id, tags before, tags after), with None before a
+    create and after a delete. Only tags that actually changed are counted.
+    """
+    totals = Counter()
+    buckets = Counter()
+    for blog_id, old_tags, new_tags in changes:
+        old_tags = set(old_tags or [])
+        new_tags = set(new_tags or [])
+        bucket = bucket_of(blog_id)
+        for tag in new_tags - old_tags:
+            totals[tag] += 1
+            buckets[(tag, bucket)] += 1
+        for tag in old_tags - new_tags:
+            totals[tag] -= 1
+            buckets[(tag, bucket)] -= 1
+
+    totals = {tag: delta for tag, delta in totals.items() if delta}
+    buckets = {key: delta for key, delta in buckets.items() if delta}
+    if totals:
+        await db.get_collection(TAG_STATS_COLLECTION).bulk_write([
+            UpdateOne({"_id": tag}, {"$inc": {"total": delta}}, upsert=True)
+            for tag, delta in totals.items()
+        ], ordered=False)
+    if buckets:
+        await db.get_collection(TAG_BUCKETS_COLLECTION).bulk_write([
+            UpdateOne({"_id": {"tag": tag, "bucket": bucket}},
+                      {"$inc": {"count": delta}, "$setOnInsert": {
+                          "tag": tag, "bucket": bucket}},
+                      upsert=True)
+            for (tag, bucket), delta in buckets.items()
+        ], ordered=False)
+
+
+async def get_tag_stats(db: AsyncIOMotorDatabase) -> List[dict]:
+    """
+    Function to read the number of blogs per tag, most used first.
+    """
+    stats = db.get_collection(TAG_STATS_COLLECTION).find(
+        {"total": {"$gt": 0}}).sort("total", -1)
+    return [{"tag": stat["_id"], "count": stat["total"]} async for stat in stats]
+
+
+async def get_trending_tags(db: AsyncIOMotorDatabase, hours: int, limit: int) -> List[dict]:
+    """
+    Function to rank the tags by the blogs created in the last `hours`,
+    compared with the window before it.
+    """
+    now = datetime.now(timezone.utc)
+    window_start = now - timedelta(hours=hours)
+    previous_start = window_start - timedelta(hours=hours)
+
+    current = Counter()
+    previous = Counter()
+    buckets = db.get_collection(TAG_BUCKETS_COLLECTION).find(
+        {"bucket": {"$gte": previous_start}}, {"tag": 1, "bucket": 1, "count": 1})
+    async for bucket in buckets:
+        bucket_time = bucket["bucket"].replace(tzinfo=timezone.utc)
+        if bucket_time >= window_start:
+            current[bucket["tag"]] += bucket["count"]
+        else:
+            previous[bucket["tag"]] += bucket["count"]
+
+    trending = [
+        {"tag": tag, "count": count, "previous_count": previous[tag],
+         "growth": count - previous[tag]}
+        for tag, count in current.items() if count > 0
+    ]
+    trending.sort(key=lambda item: (-item["count"], -item["growth"], item["tag"]))
+    return trending[:limit]
+
+
+async def reconcile_tag_stats(db: AsyncIOMotorDatabase, fix: bool = False) -> List[str]:
+    """
+    Function to recount the tag counters from the blogs and report drift.
+
+    With `fix` the counters are replaced by the fresh count. Writes made
+    while the rebuild runs may be lost, run it in a quiet period.
+    """
+    blogs = db.get_collection('Blogs')
+    drift = []
+
+    expected_totals = {stat["_id"]: stat["total"] async for stat in blogs.aggregate(TAG_TOTALS_PIPELINE)}
+    stored_totals = {stat["_id"]: stat["total"] async for stat in db.get_collection(TAG_STATS_COLLECTION).find()}
+    for tag in sorted(set(expected_totals) | set(stored_totals)):
+        expected, stored = expected_totals.get(tag, 0), stored_totals.get(tag, 0)
+        if expected != stored:
+            drift.append(f"total {tag}: stored {stored}, counted {expected}")
+
+    expected_buckets = {(bucket["tag"], bucket["bucket"]): bucket["count"] async for bucket in blogs.aggregate(TAG_BUCKETS_PIPELINE)}
+    stored_buckets = {(bucket["tag"], bucket["bucket"]): bucket["count"] async for bucket in db.get_collection(TAG_BUCKETS_COLLECTION).find()}
+    for key in sorted(set(expected_buckets) | set(stored_buckets)):
+        expected, stored = expected_buckets.get(key, 0), stored_buckets.get(key, 0)
+        if expected != stored:
+            drift.append(f"bucket {key[0]} {key[1].isoformat()}: stored {stored}, counted {expected}")
+
+    if fix and drift:
+        for pipeline in REBUILD_TAG_STATS_PIPELINES:
+            await blogs.aggregate(pipeline).to_list(length=None)
+
+    return drift
@@ -0,0 +1,244 @@
+import asyncio
+import copy
+import os
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+# The settings are read on import, point them at a database never reached
+os.environ.setdefault("database_uri", "mongodb://localhost:27017")
+os.environ.setdefault("database_name", "fastblog_test")
+os.environ.setdefault("secret_key", "test-secret")
+os.environ.setdefault("algorithm", "HS256")
+
+import httpx  # noqa: E402
+from auth import get_current_user  # noqa: E402
+from database import get_db, get_read_db  # noqa: E402
+from main import app  # noqa: E402
+from models import User  # noqa: E402
+from response_cache import InMemoryCacheBackend, response_cache  # noqa: E402
+from settings import settings  # noqa: E402
+from singleflight import single_flight  # noqa: E402
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            for operator, operand in condition.items():
+                if operator == "$gt" and not (value is not None and value > operand):
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$exists" and (field in document) != operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document: dict, projection) -> dict:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    included = {field for field, flag in projection.items() if flag and field != "_id"}
+    if included:
+        projected = {field: document[field] for field in included if field in document}
+        if projection.get("_id", 1):
+            projected["_id"] = document["_id"]
+        return projected
+    return {field: value for field, value in document.items() if projection.get(field, 1)}
+
+
+def _apply_update(document: dict, update: dict, inserting: bool = False):
+    for field, value in update.get("$set", {}).items():
+        document[field] = copy.deepcopy(value)
+    for field in update.get("$unset", {}):
+        document.pop(field, None)
+    for field, value in update.get("$inc", {}).items():
+        document[field] = document.get(field, 0) + value
+    if inserting:
+        for field, value in update.get("$setOnInsert", {}).items():
+            document[field] = copy.deepcopy(value)
+
+# In-memory stand-in for the Motor cursor
+
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", query: dict, projection):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.sort_key = None
+        self.skipped = 0
+        self.limited = 0
+        self.closed = False
+
+    def sort(self, key, direction=1):
+        self.sort_key = (key, direction)
+        return self
+
+    def skip(self, count: int):
+        self.skipped = count
+        return self
+
+    def limit(self, count: int):
+        self.limited = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _results(self) -> list:
+        documents = [document for document in self.collection.documents
+                     if _matches(document, self.query)]
+        if self.sort_key is not None:
+            key, direction = self.sort_key
+            documents.sort(key=lambda document: document.get(key), reverse=direction == -1)
+        documents = documents[self.skipped:]
+        if self.limited:
+            documents = documents[:self.limited]
+        return [_project(document, self.projection) for document in documents]
+
+    async def to_list(self, length=None):
+        self.collection.calls["find"] += 1
+        results = self._results()[:length]
+        await asyncio.sleep(self.collection.delay)
+        return results
+
+    def __aiter__(self):
+        self.collection.calls["find"] += 1
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.closed = True
+
+# In-memory stand-in for a Motor collection, counting the calls it gets
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.calls = {"find": 0, "find_one": 0, "write": 0}
+        self.delay = 0.0
+        self.cursors = []
+
+    async def find_one(self, query=None, projection=None):
+        self.calls["find_one"] += 1
+        # The result is read when the query starts, then takes the delay
+        found = next((_project(document, projection) for document in self.documents
+                      if _matches(document, query or {})), None)
+        await asyncio.sleep(self.delay)
+        return found
+
+    def find(self, query=None, projection=None):
+        cursor = FakeCursor(self, query or {}, projection)
+        self.cursors.append(cursor)
+        return cursor
+
+    async def insert_one(self, document: dict):
+        self.calls["write"] += 1
+        document.setdefault("_id", ObjectId())
+        self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents: list, ordered: bool = True):
+        for document in documents:
+            await self.insert_one(document)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        self.calls["write"] += 1
+        for document in self.documents:
+            if _matches(document, query):
+                _apply_update(document, update)
+                return
+        if upsert:
+            document = {key: value for key, value in query.items() if not key.startswith("$")}
+            document.setdefault("_id", ObjectId())
+            _apply_update(document, update, inserting=True)
+            self.documents.append(document)
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        for request in requests:
+            await self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    async def find_one_and_update(self, query: dict, update: dict, projection=None, return_document=ReturnDocument.BEFORE):
+        self.calls["write"] += 1
+        for document in self.documents:
+            if _matches(document, query):
+                before = _project(document, projection)
+                _apply_update(document, update)
+                return before if return_document == ReturnDocument.BEFORE else _project(document, projection)
+        return None
+
+    async def find_one_and_delete(self, query: dict, projection=None):
+        self.calls["write"] += 1
+        for document in self.documents:
+            if _matches(document, query):
+                self.documents.remove(document)
+                return _project(document, projection)
+        return None
+
+# In-memory stand-in for a Motor database
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection()
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        return self.get_collection(name)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def user():
+    return User(id=str(ObjectId()), username="alice", email="alice@example.com",
+                hashed_password="", tags=["python"])
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # Every test starts from an empty response cache and fresh counters
+    response_cache.backend = InMemoryCacheBackend(
+        max_entries=settings.response_cache_max_entries,
+        ttl=settings.response_cache_ttl_seconds)
+    response_cache.hits = response_cache.misses = 0
+    single_flight.executed = single_flight.coalesced = 0
+    yield
+
+
+@pytest.fixture
+async def client(db, user):
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: user
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+        yield http_client
+    app.dependency_overrides.clear()
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionController, AdmissionMiddleware, InMemoryRateLimitBackend, RateLimitBackend, route_class
+from settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+def _app(release: asyncio.Event):
+    # Heavy requests hold their slot until released, light ones return at once
+    async def app(scope, receive, send):
+        if route_class(scope["method"], scope["path"]) == "heavy":
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def _client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_route_classes():
+    assert route_class("POST", "/users/login") == "auth"
+    assert route_class("GET", "/dashboard/") == "heavy"
+    assert route_class("GET", "/blogs/search") == "heavy"
+    assert route_class("GET", "/blogs/") == "light"
+    assert route_class("GET", "/blogs/65f000000000000000000000") == "light"
+    assert route_class("POST", "/blogs/") == "write"
+    assert route_class("GET", "/metrics") is None
+
+
+def test_rate_limit_backend_without_take_fails_on_instantiation():
+    class NoTakeBackend(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        NoTakeBackend()
+
+
+async def test_saturated_heavy_class_sheds_while_light_requests_pass():
+    controller = AdmissionController(
+        limits={"heavy": 2, "light": 2}, queue_timeout=0.2, max_waiting=10, retry_after=3)
+    release = asyncio.Event()
+    async with _client(AdmissionMiddleware(_app(release), controller=controller)) as client:
+        # Fill the heavy slots
+        running = [asyncio.ensure_future(client.get("/dashboard/")) for _ in range(2)]
+        while controller.limiters["heavy"].active < 2:
+            await asyncio.sleep(0.001)
+
+        # More heavy requests wait out the queue timeout and are shed
+        shed = await asyncio.gather(*[client.get("/blogs/search", params={"q": "x"}) for _ in range(3)])
+        assert [response.status_code for response in shed] == [503] * 3
+        assert {response.headers["Retry-After"] for response in shed} == {"3"}
+        assert controller.limiters["heavy"].shed == 3
+
+        # Light requests keep their own slots and never wait out a queue timeout
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        light = await asyncio.gather(*[client.get("/blogs/") for _ in range(10)])
+        assert [response.status_code for response in light] == [200] * 10
+        assert loop.time() - start < 0.2
+        assert controller.limiters["light"].shed == 0
+
+        release.set()
+        assert [response.status_code for response in await asyncio.gather(*running)] == [200, 200]
+
+
+async def test_full_wait_queue_sheds_without_waiting():
+    controller = AdmissionController(
+        limits={"heavy": 1}, queue_timeout=10, max_waiting=0, retry_after=1)
+    release = asyncio.Event()
+    async with _client(AdmissionMiddleware(_app(release), controller=controller)) as client:
+        running = asyncio.ensure_future(client.get("/dashboard/"))
+        while controller.limiters["heavy"].active < 1:
+            await asyncio.sleep(0.001)
+
+        response = await asyncio.wait_for(client.get("/dashboard/"), timeout=1)
+        assert response.status_code == 503
+
+        release.set()
+        assert (await running).status_code == 200
+
+
+async def test_rate_limit_refuses_clients_over_their_budget(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_per_second", 1)
+    monkeypatch.setattr(settings, "rate_limit_burst", 2)
+    controller = AdmissionController(
+        limits={}, queue_timeout=1, max_waiting=10, retry_after=1,
+        rate_backend=InMemoryRateLimitBackend(max_clients=100))
+    async with _client(AdmissionMiddleware(_app(asyncio.Event()), controller=controller)) as client:
+        statuses = [(await client.get("/blogs/")).status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        response = await client.get("/blogs/")
+        assert response.headers["Retry-After"] == "1"
+        assert controller.rate_limited == 2
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def small_bulk_limits(monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_items", 2)
+    monkeypatch.setattr(settings, "bulk_insert_batch_size", 1)
+
+
+def _blogs(user, count: int) -> list:
+    return [{"title": f"Blog {index}", "content": "Some content", "author": user.username, "tags": ["python"]}
+            for index in range(count)]
+
+
+async def test_oversized_array_is_refused_before_any_insert(client, db, user, small_bulk_limits):
+    response = await client.post("/blogs/bulk", json=_blogs(user, 3))
+
+    assert response.status_code == 413
+    assert db.Blogs.documents == []
+
+
+async def test_oversized_ndjson_keeps_the_blogs_before_the_limit(client, db, user, small_bulk_limits):
+    body = "\n".join(json.dumps(blog) for blog in _blogs(user, 3)) + "\n"
+    response = await client.post("/blogs/bulk", content=body,
+                                 headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert len(result["blog_ids"]) == 2
+    assert [error["index"] for error in result["errors"]] == [2]
+    assert len(db.Blogs.documents) == 2
+
+
+async def test_ndjson_within_the_limit_has_no_errors(client, db, user, small_bulk_limits):
+    body = "\n".join(json.dumps(blog) for blog in _blogs(user, 2))
+    response = await client.post("/blogs/bulk", content=body,
+                                 headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 2
+    assert response.json()["errors"] == []
@@ -0,0 +1,15 @@
+import pytest
+
+from main import app, lifespan
+from settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_compression_refuses_to_start_without_accepting_unsearchable_content(monkeypatch):
+    monkeypatch.setattr(settings, "content_compression", "zlib")
+    monkeypatch.setattr(settings, "content_compression_allow_unsearchable", False)
+
+    with pytest.raises(RuntimeError, match="content_compression_allow_unsearchable"):
+        async with lifespan(app):
+            pass
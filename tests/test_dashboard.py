@@ -0,0 +1,35 @@
+import pytest
+
+from blog_writes import blogs_created, new_blog_document
+from models import Blog
+from pagination import NEXT_CURSOR_HEADER
+from response_cache import response_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def _insert_blogs(db, user, count: int):
+    documents = [new_blog_document(Blog(title=f"t{index}", content="Some content", author=user.username,
+                                        tags=["python"]), user.username) for index in range(count)]
+    for document in documents:
+        await db.Blogs.insert_one(document)
+    await blogs_created(db, documents)
+
+
+async def _titles(client, **params) -> list:
+    response = await client.get("/dashboard/", params=dict(limit=2, **params))
+    assert response.status_code == 200
+    return [blog["title"] for blog in response.json()]
+
+
+async def test_dashboard_cursor_continues_after_the_previous_page(client, db, user, monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", False)
+    await _insert_blogs(db, user, 8)
+
+    first = await client.get("/dashboard/", params={"limit": 2})
+    assert [blog["title"] for blog in first.json()] == ["t0", "t1"]
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+
+    # page is ignored once a cursor positions the page
+    assert await _titles(client, cursor=cursor) == ["t2", "t3"]
+    assert await _titles(client, cursor=cursor, page=3) == ["t2", "t3"]
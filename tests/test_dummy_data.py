@@ -0,0 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from configs.auth_config import bcrypt_context
+from dummy_data_generator import FAST_HASH_ROUNDS, blog_batches, create_users, hash_password, init_blog_worker
+from feed import tag_key
+
+
+def test_fast_hash_mode_is_verifiable():
+    hashed = hash_password("secret", FAST_HASH_ROUNDS)
+
+    assert hashed.startswith(f"$2b${FAST_HASH_ROUNDS:02d}$")
+    assert bcrypt_context.verify("secret", hashed)
+    assert not bcrypt_context.verify("other", hashed)
+
+
+def test_seeding_builds_users_and_blog_batches():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        users, credentials = create_users(5, 42, executor, FAST_HASH_ROUNDS)
+    assert len({user["username"] for user in users}) == 5
+    assert len({user["email"] for user in users}) == 5
+    for user, (username, password) in zip(users, credentials):
+        assert user["username"] == username
+        assert bcrypt_context.verify(password, user["hashed_password"])
+
+    authors = [user["username"] for user in users]
+
+    def titles() -> list:
+        with ProcessPoolExecutor(max_workers=2, initializer=init_blog_worker, initargs=(authors,)) as executor:
+            batches = list(blog_batches(25, 10, 42, executor, window=2))
+        assert [len(batch) for batch in batches] == [10, 10, 5]
+        for blog in (blog for batch in batches for blog in batch):
+            assert blog["author"] in authors
+            assert blog["tag_key"] == tag_key(blog["tags"])
+        return [blog["title"] for batch in batches for blog in batch]
+
+    # The same seed builds the same blogs whichever worker ran each batch
+    assert titles() == titles()
@@ -0,0 +1,39 @@
+import json
+
+import anyio
+import pytest
+
+from blog_writes import new_blog_document
+from models import Blog
+from routes.blogs import export_blogs
+
+pytestmark = pytest.mark.anyio
+
+
+async def _insert_blogs(db, user, count: int):
+    for index in range(count):
+        blog = Blog(title=f"Blog {index}", content="Some content", author=user.username, tags=["python"])
+        await db.Blogs.insert_one(new_blog_document(blog, user.username))
+
+
+async def test_export_streams_one_blog_per_line(client, db, user):
+    await _insert_blogs(db, user, 3)
+
+    response = await client.get("/blogs/export")
+
+    assert response.status_code == 200
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["Blog 0", "Blog 1", "Blog 2"]
+    assert db.Blogs.cursors[-1].closed
+
+
+async def test_cancelled_export_still_closes_the_cursor(db, user):
+    await _insert_blogs(db, user, 3)
+    response = await export_blogs(db, tag=None, author=None, fields=None, view="full")
+
+    # A client disconnect cancels the stream while it is being read
+    with anyio.CancelScope() as scope:
+        await response.body_iterator.__anext__()
+        scope.cancel()
+        await response.body_iterator.aclose()
+
+    assert db.Blogs.cursors[-1].closed
@@ -0,0 +1,101 @@
+import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+import indexes
+from indexes import ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+
+class _Cursor:
+    def __init__(self, results: list):
+        self.results = results
+
+    async def to_list(self, length=None):
+        return self.results[:length]
+
+# Collection holding indexes, building a unique one fails on duplicates
+
+
+class IndexCollection:
+    def __init__(self, documents: list, existing: dict):
+        self.documents = documents
+        self.indexes = existing
+
+    async def index_information(self) -> dict:
+        return dict(self.indexes)
+
+    async def drop_index(self, name: str):
+        del self.indexes[name]
+
+    async def create_indexes(self, models: list):
+        for model in models:
+            document = model.document
+            fields = [field for field, _ in document["key"].items()]
+            values = [tuple(doc.get(field) for field in fields) for doc in self.documents]
+            if document.get("unique") and len(set(values)) < len(values):
+                raise OperationFailure("E11000 duplicate key error")
+            self.indexes[document["name"]] = {
+                "key": list(document["key"].items()),
+                **{option: value for option, value in document.items() if option not in ("key", "name")}}
+
+    def aggregate(self, pipeline: list, allowDiskUse: bool = False):
+        fields = [value[1:] for value in pipeline[1]["$group"]["_id"].values()]
+        counts = {}
+        for document in self.documents:
+            value = tuple(document.get(field) for field in fields)
+            counts[value] = counts.get(value, 0) + 1
+        return _Cursor([{"_id": value, "count": count} for value, count in counts.items() if count > 1])
+
+
+class IndexDatabase:
+    def __init__(self, collection: IndexCollection):
+        self.collection = collection
+
+    def get_collection(self, name: str) -> IndexCollection:
+        return self.collection
+
+
+def _users(usernames: list) -> IndexDatabase:
+    return IndexDatabase(IndexCollection(
+        [{"username": username} for username in usernames],
+        {"_id_": {"key": [("_id", 1)]}, "username_1": {"key": [("username", 1)]}}))
+
+
+@pytest.fixture
+def unique_usernames(monkeypatch):
+    monkeypatch.setattr(indexes, "INDEXES", {"Users": [
+        IndexModel([("username", ASCENDING)], name="username_1", unique=True)]})
+
+
+async def test_duplicates_keep_the_drifted_index(unique_usernames):
+    db = _users(["alice", "bob", "alice"])
+
+    report = await ensure_indexes(db, fix_drift=True)
+
+    assert report["failed"] == ["Users.username_1"]
+    assert db.collection.indexes["username_1"] == {"key": [("username", 1)]}
+
+
+async def test_failed_build_restores_the_drifted_index(unique_usernames, monkeypatch):
+    db = _users(["alice", "bob", "alice"])
+
+    # A duplicate the check did not see, written while it ran
+    async def no_duplicates(collection, index):
+        return False
+    monkeypatch.setattr(indexes, "_has_duplicates", no_duplicates)
+
+    report = await ensure_indexes(db, fix_drift=True)
+
+    assert report["failed"] == ["Users.username_1"]
+    assert db.collection.indexes["username_1"] == {"key": [("username", 1)]}
+
+
+async def test_drifted_index_is_replaced(unique_usernames):
+    db = _users(["alice", "bob"])
+
+    report = await ensure_indexes(db, fix_drift=True)
+
+    assert report == {"created": [], "drifted": ["Users.username_1"], "failed": []}
+    assert db.collection.indexes["username_1"]["unique"] is True
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import passwords
+from passwords import PasswordHasher
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def plain_hashing(monkeypatch):
+    # bcrypt itself is not under test, only the worker pool around it
+    monkeypatch.setattr(passwords, "bcrypt_context", SimpleNamespace(
+        hash=lambda password: f"hashed:{password}",
+        verify=lambda password, hashed: hashed == f"hashed:{password}"))
+
+
+async def test_hasher_works_across_restarts():
+    hasher = PasswordHasher(max_workers=1, max_pending=4)
+    for _ in range(2):
+        hasher.start()
+        hashed = await hasher.hash("secret")
+        assert await hasher.verify("secret", hashed)
+        hasher.shutdown()
+
+
+async def test_hasher_refuses_work_before_start():
+    with pytest.raises(RuntimeError):
+        await PasswordHasher(max_workers=1, max_pending=4).hash("secret")
+
+
+async def test_hasher_sheds_work_past_max_pending(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(passwords.bcrypt_context, "hash",
+                        lambda password: release.wait() and f"hashed:{password}")
+    hasher = PasswordHasher(max_workers=1, max_pending=2)
+    hasher.start()
+    try:
+        # One hash runs and one waits for the worker, the pool is full
+        running = [asyncio.ensure_future(hasher.hash("secret")) for _ in range(2)]
+        while hasher.pending < 2:
+            await asyncio.sleep(0.001)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher.hash("secret")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": "1"}
+        assert hasher.rejected == 1
+    finally:
+        release.set()
+        assert await asyncio.gather(*running) == ["hashed:secret"] * 2
+        hasher.shutdown()
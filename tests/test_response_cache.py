@@ -0,0 +1,81 @@
+import pytest
+
+from blog_writes import new_blog_document
+from models import Blog
+from response_cache import BLOGS_NAMESPACE, CacheBackend, InMemoryCacheBackend, ResponseCache, response_cache
+
+pytestmark = pytest.mark.anyio
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    # A shared backend missing the versions never reaches a request
+    class EntriesOnlyBackend(CacheBackend):
+        async def get(self, key):
+            return None
+
+        async def set(self, key, value):
+            pass
+
+    with pytest.raises(TypeError):
+        EntriesOnlyBackend()
+
+
+async def test_invalidate_bumps_the_namespace_version():
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10, ttl=60))
+    key = await cache.key(BLOGS_NAMESPACE, "list", 1)
+    await cache.set(key, ["page"])
+    assert await cache.get(key) == ["page"]
+
+    await cache.invalidate(BLOGS_NAMESPACE)
+
+    new_key = await cache.key(BLOGS_NAMESPACE, "list", 1)
+    assert new_key != key
+    assert await cache.get(new_key) is None
+
+
+async def test_invalidate_leaves_other_namespaces_alone():
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10, ttl=60))
+    key = await cache.key("users", "list", 1)
+    await cache.set(key, ["page"])
+
+    await cache.invalidate(BLOGS_NAMESPACE)
+
+    assert await cache.key("users", "list", 1) == key
+    assert await cache.get(key) == ["page"]
+
+
+async def _listing_titles(client) -> list:
+    response = await client.get("/blogs/")
+    assert response.status_code == 200
+    return [blog["title"] for blog in response.json()]
+
+
+@pytest.mark.parametrize("write, expected_titles", [
+    ("create", ["First", "Second"]),
+    ("update", ["Updated"]),
+    ("delete", []),
+])
+async def test_blog_writes_invalidate_the_cached_listing(client, db, user, write, expected_titles):
+    blog = Blog(title="First", content="Some content", author=user.username, tags=["python"])
+    blog_id = (await db.Blogs.insert_one(new_blog_document(blog, user.username))).inserted_id
+
+    # The second read is served from the cache
+    assert await _listing_titles(client) == ["First"]
+    assert await _listing_titles(client) == ["First"]
+    assert (response_cache.hits, response_cache.misses) == (1, 1)
+    key = await response_cache.key(BLOGS_NAMESPACE, "list", ("page", 1), 10, "None|full")
+
+    if write == "create":
+        response = await client.post("/blogs/", json={
+            "title": "Second", "content": "More content", "author": user.username, "tags": ["go"]})
+    elif write == "update":
+        response = await client.put(f"/blogs/{blog_id}", json={
+            "title": "Updated", "content": "New content", "author": user.username, "tags": ["python"]})
+    else:
+        response = await client.delete(f"/blogs/{blog_id}")
+    assert response.status_code == 200
+
+    # The write moved the namespace to a new version, the next read misses
+    assert await response_cache.key(BLOGS_NAMESPACE, "list", ("page", 1), 10, "None|full") != key
+    assert await _listing_titles(client) == expected_titles
+    assert (response_cache.hits, response_cache.misses) == (1, 2)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from blog_writes import new_blog_document
+from models import Blog
+from singleflight import SingleFlight, single_flight
+
+pytestmark = pytest.mark.anyio
+
+
+async def _insert_blog(db, user, title: str = "First") -> str:
+    blog = Blog(title=title, content="Some content", author=user.username, tags=["python"])
+    return str((await db.Blogs.insert_one(new_blog_document(blog, user.username))).inserted_id)
+
+
+async def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*[flight.do("key", load) for _ in range(10)])
+
+    assert results == ["value"] * 10
+    assert calls == 1
+    assert (flight.executed, flight.coalesced) == (1, 9)
+
+
+async def test_simultaneous_blog_reads_make_one_query(client, db, user):
+    blog_id = await _insert_blog(db, user)
+    db.Blogs.delay = 0.05
+
+    responses = await asyncio.gather(*[client.get(f"/blogs/{blog_id}") for _ in range(20)])
+
+    assert {response.status_code for response in responses} == {200}
+    assert {response.json()["title"] for response in responses} == {"First"}
+    assert db.Blogs.calls["find_one"] == 1
+    assert (single_flight.executed, single_flight.coalesced) == (1, 19)
+
+
+async def test_read_after_update_does_not_join_an_older_load(client, db, user):
+    blog_id = await _insert_blog(db, user)
+    db.Blogs.delay = 0.05
+
+    # Start a slow read, then update the blog while it is in flight
+    stale_read = asyncio.ensure_future(client.get(f"/blogs/{blog_id}"))
+    await asyncio.sleep(0.01)
+    response = await client.put(f"/blogs/{blog_id}", json={
+        "title": "Updated", "content": "New content", "author": user.username, "tags": ["python"]})
+    assert response.status_code == 200
+
+    fresh_read = await client.get(f"/blogs/{blog_id}")
+
+    assert (await stale_read).json()["title"] == "First"
+    assert fresh_read.json()["title"] == "Updated"
+    assert db.Blogs.calls["find_one"] == 2
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError
+from blog_writes import blogs_created
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Class to batch blog inserts and flush them with unordered insert_many
+
+
+class BlogWriteBatcher:
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.db = None
+        self.flushed_batches = 0
+        self.flushed_documents = 0
+        self.failed_documents = 0
+
+    def start(self, db):
+        """
+        Start the flush loop on the running event loop.
+        """
+        self.db = db
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Drain the queue and stop the flush loop.
+        """
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def submit(self, document: dict, acknowledged: bool = True):
+        """
+        Queue a blog document that already carries its _id.
+
+        With `acknowledged` the call returns once the batch holding the
+        document was written, otherwise as soon as it is queued.
+        """
+        if self.queue is None:
+            raise RuntimeError("The write batcher is not started")
+
+        future = asyncio.get_running_loop().create_future() if acknowledged else None
+        try:
+            self.queue.put_nowait((document, future))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending blog writes",
+                headers={"Retry-After": "1"},
+            )
+        if future is not None:
+            await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a first document, then fill the batch until it is
+            # full or the flush interval elapsed
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]):
+        rejected = {}
+        try:
+            await self.db.get_collection('Blogs').insert_many(
+                [document for document, _ in batch], ordered=False)
+        except BulkWriteError as exc:
+            for write_error in exc.details.get("writeErrors", []):
+                rejected[write_error["index"]] = write_error.get("errmsg", "Write failed")
+        except Exception as exc:
+            logger.exception("Blog write batch failed")
+            rejected = {index: str(exc) for index in range(len(batch))}
+
+        inserted = []
+        for index, (document, future) in enumerate(batch):
+            if index in rejected:
+                self.failed_documents += 1
+                if future is not None and not future.done():
+                    future.set_exception(HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Blog could not be stored",
+                    ))
+                else:
+                    logger.error("Fire-and-forget blog %s was not stored: %s",
+                                 document["_id"], rejected[index])
+            else:
+                inserted.append(document)
+
+        try:
+            await blogs_created(self.db, inserted)
+        except Exception:
+            logger.exception("Could not update the data derived from a blog batch")
+
+        self.flushed_batches += 1
+        self.flushed_documents += len(inserted)
+        for document, future in batch:
+            if future is not None and not future.done():
+                future.set_result(document["_id"])
+
+
+# Create an instance of the BlogWriteBatcher class, started in the app
+# lifespan when the write-behind mode is enabled
+blog_write_batcher = BlogWriteBatcher(
+    batch_size=settings.write_behind_batch_size,
+    flush_interval=settings.write_behind_flush_interval_ms / 1000,
+    max_queue=settings.write_behind_max_queue,
+)